@@ -1,9 +1,9 @@
-from django.views.generic import TemplateView
+from core.prerender import PrerenderedTemplateView
 
 
-class AboutAuthorView(TemplateView):
+class AboutAuthorView(PrerenderedTemplateView):
     template_name = 'about/author.html'
 
 
-class AboutTechView(TemplateView):
+class AboutTechView(PrerenderedTemplateView):
     template_name = 'about/tech.html'
@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from posts.models import Post
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время ответа HTML-страниц и JSON API на одних данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=100)
+
+    def handle(self, *args, **options):
+        post = Post.objects.exclude(group=None).first()
+        if post is None:
+            raise CommandError('Нужен хотя бы один пост с группой.')
+        pairs = (
+            (reverse('posts:index'), reverse('api:posts')),
+            (
+                reverse('posts:group_list', args=(post.group.slug,)),
+                reverse('api:group_posts', args=(post.group.slug,)),
+            ),
+            (
+                reverse('posts:profile', args=(post.author.username,)),
+                reverse('api:author_posts', args=(post.author.username,)),
+            ),
+            (
+                reverse('posts:post_detail', args=(post.pk,)),
+                reverse('api:post_detail', args=(post.pk,)),
+            ),
+        )
+        self.stdout.write('адрес: мс на запрос без кешей, HTML / JSON')
+        with override_settings(CACHES=DUMMY_CACHES):
+            for html_url, api_url in pairs:
+                html = self.measure(html_url, options['repeat'])
+                api = self.measure(api_url, options['repeat'])
+                self.stdout.write(
+                    f'{html_url}: {html:.3f} / {api:.3f} '
+                    f'(в {html / api:.1f} раза быстрее)'
+                )
+
+    def measure(self, url, repeat):
+        match = resolve(url)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        match.func(request, *match.args, **match.kwargs)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            match.func(request, *match.args, **match.kwargs)
+        return (time.perf_counter() - started) * 1000 / repeat
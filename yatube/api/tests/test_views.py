@@ -0,0 +1,89 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test group', slug='test-slug', description='test'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'text {i}')
+            for i in range(15)
+        )
+        cls.post = Post.objects.latest('pk')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='hi')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_paginated_by_cursor(self):
+        """Ленты отдаются порциями по курсору без повторов."""
+        urls = (
+            reverse('api:posts'),
+            reverse('api:group_posts', args=(self.group.slug,)),
+            reverse('api:author_posts', args=(self.author.username,)),
+            reverse('api:follow_posts'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.reader_client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['author'], 'author')
+                second = self.reader_client.get(
+                    url, {'cursor': data['next']}
+                ).json()
+                ids = [item['id'] for item in data['results']]
+                ids += [item['id'] for item in second['results']]
+                self.assertEqual(len(set(ids)), 15)
+                self.assertIsNone(second['next'])
+
+    def test_sparse_fields(self):
+        """Параметр fields оставляет в ответе только нужные поля."""
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=(self.post.pk,)),
+            {'fields': 'id,text'},
+        )
+        self.assertEqual(
+            response.json(), {'id': self.post.pk, 'text': self.post.text}
+        )
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304."""
+        url = reverse('api:post_detail', args=(self.post.pk,))
+        response = self.guest_client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_comments_and_errors(self):
+        """Комментарии поста и ошибки в формате JSON."""
+        data = self.guest_client.get(
+            reverse('api:comments', args=(self.post.pk,))
+        ).json()
+        self.assertEqual(data['results'][0]['text'], 'hi')
+        self.assertEqual(
+            self.guest_client.get(reverse('api:follow_posts')).status_code,
+            401,
+        )
+        self.assertEqual(
+            self.guest_client.get(
+                reverse('api:post_detail', args=(0,))
+            ).status_code,
+            404,
+        )
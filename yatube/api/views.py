@@ -0,0 +1,248 @@
+import hashlib
+import heapq
+import json
+from functools import wraps
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from posts import sharding
+from posts.models import Comment, Group, Post, User
+from posts.utils import decode_cursor, encode_cursor, keyset_filter
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated_at': 'updated_at',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+# В шардах нет пользователей и групп: эти поля читаются по id из default.
+JOINED_FIELDS = {
+    'author__username': ('author_id', User, 'username'),
+    'group__slug': ('group_id', Group, 'slug'),
+}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def api_view(view):
+    """GET-обработчик API, превращающий ApiError в JSON-ответ."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'detail': error.detail}, status=error.status)
+    return wrapper
+
+
+def selected_fields(request, fields):
+    if not request.GET.get('fields'):
+        return list(fields)
+    names = request.GET['fields'].split(',')
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    return names
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    if not 0 < limit <= MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return limit
+
+
+def get_cursor(request):
+    if not request.GET.get('cursor'):
+        return None
+    cursor = decode_cursor(request.GET['cursor'])
+    if cursor is None:
+        raise ApiError('Неверный курсор')
+    return cursor
+
+
+def to_dict(names, row):
+    item = dict(zip(names, row))
+    if 'image' in item:
+        item['image'] = (
+            settings.MEDIA_URL + item['image'] if item['image'] else None
+        )
+    return item
+
+
+def json_response(request, data, last_modified=None):
+    """JSON с ETag по содержимому и Last-Modified, если он известен."""
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    body = body.encode()
+    etag = f'"{hashlib.md5(body).hexdigest()}"'
+    if last_modified is not None:
+        last_modified = int(last_modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def fetch_rows(querysets, lookups, limit, descending=True):
+    """Первые limit строк values_list, слитые из запросов к шардам.
+
+    Все запросы упорядочены по первым двум полям. При шардинге поля
+    из JOINED_FIELDS читаются как id и заменяются значениями из
+    default одним запросом на поле.
+    """
+    if not sharding.enabled():
+        queryset, = querysets
+        return list(queryset.values_list(*lookups)[:limit])
+    columns = [JOINED_FIELDS.get(lookup, (lookup,))[0] for lookup in lookups]
+    parts = [queryset.values_list(*columns)[:limit] for queryset in querysets]
+    rows = [
+        list(row) for row in islice(heapq.merge(
+            *parts, key=lambda row: row[:2], reverse=descending
+        ), limit)
+    ]
+    for index, lookup in enumerate(lookups):
+        if lookup not in JOINED_FIELDS:
+            continue
+        _, model, field = JOINED_FIELDS[lookup]
+        values = dict(
+            model.objects.filter(pk__in={row[index] for row in rows})
+            .values_list('pk', field)
+        )
+        for row in rows:
+            row[index] = values.get(row[index])
+    return rows
+
+
+def feed(request, queryset, fields=POST_FIELDS, date_field='pub_date',
+         descending=True, aliases=None):
+    """Порция записей после курсора, собранная из кортежей values_list.
+
+    Модели не создаются: в ответ идут только запрошенные поля, а
+    дата и id нужны для курсора следующей порции. Посты читаются из
+    всех шардов, комментарии только из базы своего поста.
+    """
+    names = selected_fields(request, fields)
+    limit = get_limit(request)
+    queryset = keyset_filter(
+        queryset, get_cursor(request), date_field, descending
+    )
+    rows = fetch_rows(
+        sharding.per_shard(queryset, aliases),
+        [date_field, 'pk', *(fields[name] for name in names)],
+        limit + 1,
+        descending,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1][:2])
+    data = {
+        'results': [to_dict(names, row[2:]) for row in rows],
+        'next': next_cursor,
+    }
+    return json_response(request, data)
+
+
+@api_view
+def posts(request):
+    return feed(request, Post.objects.all())
+
+
+@api_view
+def group_posts(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    )
+    if group_id is None:
+        raise ApiError('Группа не найдена', 404)
+    return feed(request, Post.objects.filter(group_id=group_id))
+
+
+@api_view
+def author_posts(request, username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list('pk', flat=True).first()
+    )
+    if author_id is None:
+        raise ApiError('Автор не найден', 404)
+    return feed(
+        request,
+        Post.objects.filter(author_id=author_id),
+        aliases=sharding.author_aliases([author_id]),
+    )
+
+
+@api_view
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация', 401)
+    author_ids = list(
+        request.user.follower.values_list('author_id', flat=True)
+    )
+    return feed(
+        request,
+        Post.objects.filter(author_id__in=author_ids),
+        aliases=sharding.author_aliases(author_ids),
+    )
+
+
+@api_view
+def post_detail(request, post_id):
+    names = selected_fields(request, POST_FIELDS)
+    rows = fetch_rows(
+        [sharding.post_queryset(post_id).filter(pk=post_id)],
+        ['updated_at', *(POST_FIELDS[name] for name in names)],
+        1,
+    )
+    if not rows:
+        raise ApiError('Пост не найден', 404)
+    row = rows[0]
+    return json_response(request, to_dict(names, row[1:]), row[0])
+
+
+@api_view
+def comments(request, post_id):
+    posts = sharding.post_queryset(post_id)
+    if not posts.filter(pk=post_id).exists():
+        raise ApiError('Пост не найден', 404)
+    return feed(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS,
+        date_field='created',
+        descending=False,
+        aliases=[posts.db] if sharding.enabled() else None,
+    )
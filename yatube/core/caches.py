@@ -0,0 +1,469 @@
+import itertools
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+SLOT = struct.Struct('q')
+
+# Django создаёт экземпляр бэкенда на каждый поток, а хранилища
+# общие для процесса, как у LocMemCache.
+_stores = {}
+_tiers = {}
+_tier_slots = {}
+_tiers_lock = threading.Lock()
+
+
+class Generations:
+    """Таблица поколений ключей в общем mmap-файле.
+
+    Каждый ключ попадает в один из слотов. Запись в кеш кладёт в слот
+    новую метку времени, а L1 любого процесса сравнивает её с меткой,
+    запомненной при чтении: это одно чтение из памяти без системных
+    вызовов.
+    """
+
+    def __init__(self, path, slots):
+        self.slots = slots
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < slots * SLOT.size:
+                os.ftruncate(fd, slots * SLOT.size)
+            self.map = mmap.mmap(fd, slots * SLOT.size)
+        finally:
+            os.close(fd)
+
+    def slot(self, key):
+        return zlib.crc32(key.encode()) % self.slots * SLOT.size
+
+    def get(self, key):
+        return SLOT.unpack_from(self.map, self.slot(key))[0]
+
+    def bump(self, key):
+        SLOT.pack_into(self.map, self.slot(key), time.time_ns())
+
+    def bump_all(self):
+        stamp = SLOT.pack(time.time_ns())
+        self.map[:] = stamp * self.slots
+
+
+class SQLiteStore:
+    """Общий для процессов кеш в SQLite-файле, второй уровень TieredCache.
+
+    Лишние записи чистятся на каждой cull_every-й записи процесса, а не
+    на каждой: подсчёт строк в большой таблице недёшев.
+    """
+
+    def __init__(self, path, max_entries, cull_frequency, cull_every):
+        self.path = path
+        self.max_entries = max_entries
+        self.cull_frequency = cull_frequency
+        self.cull_every = cull_every
+        self.writes = itertools.count(1)
+        self.local = threading.local()
+        self.connect().execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+        )
+
+    def connect(self):
+        """Соединение потока, заново открытое после fork."""
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = wal')
+            connection.execute('PRAGMA synchronous = off')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def get(self, key):
+        """Значение и срок жизни ключа или None."""
+        return self.connect().execute(
+            'SELECT value, expires FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+
+    def set(self, key, pickled, expires):
+        connection = self.connect()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickled, expires),
+        )
+        if next(self.writes) % self.cull_every == 0:
+            self.cull(connection)
+
+    def add(self, key, pickled, expires):
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, pickled, expires),
+            ).rowcount == 1
+        finally:
+            connection.execute('COMMIT')
+        return added
+
+    def incr(self, key, delta, protocol):
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.get(key)
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, protocol), key),
+            )
+        finally:
+            connection.execute('COMMIT')
+        return value
+
+    def touch(self, key, expires):
+        return self.connect().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (expires, key, time.time()),
+        ).rowcount == 1
+
+    def delete(self, key):
+        self.connect().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self.connect().execute('DELETE FROM cache')
+
+    def count(self):
+        return self.connect().execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()[0]
+
+    def cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self.max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self.cull_frequency,),
+            )
+
+
+class LRUStore:
+    """LRU в памяти с бюджетом в байтах.
+
+    Размер записи передаёт вызывающий, обычно длину pickle. При
+    превышении бюджета вытесняются самые давно читанные записи, а
+    запись больше max_item_bytes не принимается вовсе, чтобы одна
+    большая страница не вымыла весь кеш.
+    """
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.rejected = 0
+        self.lock = threading.RLock()
+
+    def alive(self, key):
+        """Есть ли непросроченная запись; не трогает счётчики и порядок."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False
+            if entry[2] is not None and entry[2] <= time.time():
+                self.pop(key)
+                return False
+            return True
+
+    def get(self, key):
+        with self.lock:
+            if not self.alive(key):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+    def set(self, key, value, size, expires):
+        """Кладёт значение; False, если оно больше max_item_bytes."""
+        with self.lock:
+            self.pop(key)
+            if size > self.max_item_bytes:
+                self.rejected += 1
+                return False
+            self.entries[key] = (value, size, expires)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+            return True
+
+    def touch(self, key, expires):
+        with self.lock:
+            if not self.alive(key):
+                return False
+            value, size, _ = self.entries[key]
+            self.entries[key] = (value, size, expires)
+            return True
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return False
+            self.bytes -= entry[1]
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+            }
+
+
+class LRUCache(BaseCache):
+    """Локальный кеш процесса с настоящим LRU и бюджетом в байтах.
+
+    В отличие от LocMemCache, который считает записи и при переполнении
+    выбрасывает случайную треть, здесь предел задан в байтах pickle
+    (MAX_BYTES), а вытесняются самые давно читанные записи. Значения
+    больше MAX_ITEM_BYTES не кешируются. Счётчики отдаёт stats().
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        max_bytes = options.get('MAX_BYTES', 64 * 1024 * 1024)
+        with _tiers_lock:
+            if name not in _stores:
+                _stores[name] = LRUStore(
+                    max_bytes, options.get('MAX_ITEM_BYTES', max_bytes // 16)
+                )
+            self.store = _stores[name]
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = self.store.get(key)
+        if pickled is None:
+            return default
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        self.store.set(
+            key, pickled, len(pickled), self.get_backend_timeout(timeout)
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self.store.lock:
+            if self.store.alive(key):
+                return False
+            return self.store.set(
+                key, pickled, len(pickled), self.get_backend_timeout(timeout)
+            )
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.store.lock:
+            pickled = self.store.get(key)
+            if pickled is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(pickled) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            self.store.set(
+                key, pickled, len(pickled), self.store.entries[key][2]
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.store.alive(key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.store.touch(key, self.get_backend_timeout(timeout))
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.store.pop(key)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        return self.store.stats()
+
+
+class TieredCache(BaseCache):
+    """Кеш из LRU в памяти процесса поверх общего SQLite-файла.
+
+    LOCATION — каталог, где лежат файл кеша и таблица поколений.
+    L1 отдаёт значение, только пока не истёк короткий L1_TIMEOUT и не
+    сменилось поколение ключа, поэтому запись или удаление в одном
+    процессе сразу видны во всех остальных. Поколение читается до
+    значения из L2, а пишется после него: так L1 не запомнит старое
+    значение под новым поколением.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        l1_max_bytes = options.get('L1_MAX_BYTES', 8 * 1024 * 1024)
+        l1_max_item_bytes = options.get(
+            'L1_MAX_ITEM_BYTES', l1_max_bytes // 16
+        )
+        slots = options.get('GENERATION_SLOTS', 4096)
+        cull_every = options.get('CULL_EVERY', 100)
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        # Псевдонимы с общим LOCATION, но разными настройками получают
+        # свои уровни над теми же файлами, как разные процессы.
+        key = (
+            location, l1_max_bytes, l1_max_item_bytes, slots,
+            self._max_entries, self._cull_frequency, cull_every,
+        )
+        with _tiers_lock:
+            if _tier_slots.setdefault(location, slots) != slots:
+                raise ImproperlyConfigured(
+                    f'Кеши с LOCATION {location!r} должны иметь одинаковый '
+                    'GENERATION_SLOTS: таблица поколений у них общая.'
+                )
+            if key not in _tiers:
+                os.makedirs(location, exist_ok=True)
+                _tiers[key] = (
+                    LRUStore(l1_max_bytes, l1_max_item_bytes),
+                    Generations(os.path.join(location, 'generations'), slots),
+                    SQLiteStore(
+                        os.path.join(location, 'cache.sqlite3'),
+                        self._max_entries, self._cull_frequency or 3,
+                        cull_every,
+                    ),
+                )
+            self.l1, self.generations, self.store = _tiers[key]
+
+    def l1_get(self, key):
+        entry = self.l1.get(key)
+        if entry is None:
+            return None
+        pickled, generation = entry
+        if generation != self.generations.get(key):
+            self.l1.pop(key)
+            return None
+        return pickled
+
+    def l1_set(self, key, pickled, generation, expires):
+        l1_expires = time.time() + self.l1_timeout
+        if expires is not None:
+            l1_expires = min(l1_expires, expires)
+        self.l1.set(key, (pickled, generation), len(pickled), l1_expires)
+
+    def l1_forget(self, key):
+        self.l1.pop(key)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = self.l1_get(key)
+        if pickled is None:
+            generation = self.generations.get(key)
+            row = self.store.get(key)
+            if row is None:
+                return default
+            pickled, expires = row
+            self.l1_set(key, pickled, generation, expires)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        self.store.set(key, pickled, expires)
+        self.generations.bump(key)
+        self.l1_forget(key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if not self.store.add(key, pickled, self.get_backend_timeout(timeout)):
+            return False
+        self.generations.bump(key)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self.store.incr(key, delta, self.pickle_protocol)
+        self.generations.bump(key)
+        self.l1_forget(key)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        touched = self.store.touch(key, self.get_backend_timeout(timeout))
+        self.generations.bump(key)
+        self.l1_forget(key)
+        return touched
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.store.delete(key)
+        self.generations.bump(key)
+        self.l1_forget(key)
+
+    def clear(self):
+        self.store.clear()
+        self.generations.bump_all()
+        self.l1.clear()
+
+    def stats(self):
+        return {**self.l1.stats(), 'l2_entries': self.store.count()}
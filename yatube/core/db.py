@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Сессии и пользователи только что вошедших ещё могут не дойти до реплик.
+PRIMARY_APPS = ('auth', 'sessions')
+
+state = threading.local()
+# Время последнего обслуживания по алиасам баз.
+maintenance = {}
+maintenance_lock = threading.Lock()
+
+
+def replica_reads(view):
+    """Разрешает view читать с реплик, если пользователь ничего не писал."""
+    view.replica_reads = True
+    return view
+
+
+def split_alias(app_label, model_name=None):
+    """Отдельная база модели или приложения из DATABASE_APPS."""
+    return settings.DATABASE_APPS.get(
+        f'{app_label}.{model_name}', settings.DATABASE_APPS.get(app_label)
+    )
+
+
+def active_aliases():
+    """Базы, с которыми сейчас работает сайт, без объявленных про запас."""
+    return list(dict.fromkeys([
+        'default',
+        *settings.DATABASE_REPLICAS,
+        *settings.POST_SHARDS,
+        *settings.DATABASE_APPS.values(),
+    ]))
+
+
+class AppRouter:
+    """Держит сессии, миниатюры и горячие таблицы в своих базах.
+
+    У каждой такой базы своя блокировка записи, поэтому вход на сайт,
+    подписки и комментарии не ждут, пока пишутся посты.
+    """
+
+    def db_for_read(self, model, **hints):
+        return split_alias(model._meta.app_label, model._meta.model_name)
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Отдельная база получает только свои таблицы, даже пока в неё
+        # ничего не направляется.
+        labels = settings.SPLIT_DATABASE_MODELS.get(db)
+        if labels is None:
+            return None
+        return app_label in labels or f'{app_label}.{model_name}' in labels
+
+
+class ReplicaRouter:
+    """Чтения помеченных view идут на реплики, всё остальное на primary.
+
+    Сессии и пользователи всегда читаются с primary, иначе сразу после
+    входа реплика не нашла бы сессию и разлогинила бы пользователя.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            settings.DATABASE_REPLICAS
+            and getattr(state, 'replicas', False)
+            and model._meta.app_label not in PRIMARY_APPS
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Выбирает базу для запроса и закрепляет писавших за primary.
+
+    После любого изменяющего запроса браузер получает куку, и пока она
+    жива, его чтения идут на primary: так он видит свои же записи,
+    даже если реплики отстают.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state.replicas = (
+            getattr(view_func, 'replica_reads', False)
+            and request.method in SAFE_METHODS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+
+    def process_response(self, request, response):
+        state.replicas = False
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+            )
+        return response
+
+
+def maintain_sqlite(cursor, checkpoint='PASSIVE'):
+    cursor.execute(f'PRAGMA wal_checkpoint({checkpoint})')
+    cursor.execute('PRAGMA optimize')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает новое SQLite-соединение прагмами из SQLITE_PRAGMAS.
+
+    Прагмы из SQLITE_ALIAS_PRAGMAS дополняют их для отдельных баз.
+    Раз в SQLITE_MAINTENANCE_INTERVAL секунд для каждой базы новое
+    соединение с ней ещё и переносит WAL в базу без ожидания писателей
+    и обновляет статистику планировщика.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = {
+        **settings.SQLITE_PRAGMAS,
+        **settings.SQLITE_ALIAS_PRAGMAS.get(connection.alias, {}),
+    }
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        with maintenance_lock:
+            now = time.monotonic()
+            last = maintenance.setdefault(connection.alias, now)
+            due = now - last > settings.SQLITE_MAINTENANCE_INTERVAL
+            if due:
+                maintenance[connection.alias] = now
+        if due:
+            maintain_sqlite(cursor)
@@ -0,0 +1,140 @@
+import hashlib
+import re
+import time
+from functools import wraps
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.deprecation import MiddlewareMixin
+
+HOLE_RE = re.compile(r'<!--hole:(\w+)((?::[^:>]*)*)-->')
+# Параметры, от которых зависят кешируемые ленты. Запросы с другими
+# параметрами или с непохожими значениями в общий кеш не попадают.
+SHARED_PAGE_PARAMS = {
+    'page': re.compile(r'\d{1,6}'),
+    'cursor': re.compile(r'[\w-]{1,100}'),
+    'fragment': re.compile(r'\w{0,10}'),
+}
+SHARED_PAGE_VERSION_KEY = 'shared_page_version'
+
+registry = {}
+
+
+def register(name):
+    """Регистрирует функцию, которая рендерит дыру для запроса."""
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def placeholder(name, *args):
+    """Метка в кешируемой странице, на её место подставится фрагмент."""
+    encoded = ''.join(f':{quote(str(arg), safe="")}' for arg in args)
+    return f'<!--hole:{name}{encoded}-->'
+
+
+def fill(request, content):
+    def render(match):
+        args = [unquote(arg) for arg in match.group(2).split(':')[1:]]
+        return registry[match.group(1)](request, *args)
+
+    return HOLE_RE.sub(render, content)
+
+
+def bump_shared_pages():
+    """Сбрасывает все общие страницы разом, меняя версию в их ключах."""
+    cache.set(SHARED_PAGE_VERSION_KEY, time.time_ns(), None)
+
+
+def shared_page_key(request):
+    """Ключ общей страницы или None, если запрос кешировать нельзя."""
+    params = []
+    for name, values in sorted(request.GET.lists()):
+        pattern = SHARED_PAGE_PARAMS.get(name)
+        if (
+            pattern is None
+            or len(values) != 1
+            or not pattern.fullmatch(values[0])
+        ):
+            return None
+        params.append(f'{name}={values[0]}')
+    version = cache.get(SHARED_PAGE_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.set(SHARED_PAGE_VERSION_KEY, version, None)
+    path = f'{request.path}?{"&".join(params)}'.encode()
+    return f'shared_page:{version}:{hashlib.md5(path).hexdigest()}'
+
+
+def cache_page_shared(view):
+    """Кеширует страницу одну на всех пользователей.
+
+    Персональные части страницы заменены метками и заполняются
+    HolePunchMiddleware при каждом ответе, поэтому при попадании
+    в кеш view не выполняется совсем. Кто недавно писал и закреплён
+    за primary, читает страницу мимо кеша, чтобы увидеть свою запись.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = None
+        if (
+            request.method == 'GET'
+            and settings.PAGE_CACHE_TIMEOUT
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        ):
+            key = shared_page_key(request)
+        if key is None:
+            return view(request, *args, **kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response.compress_key = key
+            return response
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(
+                key,
+                (response.content, response['Content-Type']),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+            response.compress_key = key
+        return response
+    return wrapper
+
+
+class HolePunchMiddleware(MiddlewareMixin):
+    """Подставляет в HTML персональные фрагменты вместо меток.
+
+    Вошедший пользователь получает свою страницу, поэтому её сжатый
+    вариант не кешируется.
+    """
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or not response.get('Content-Type', '').startswith('text/html')
+            or b'<!--hole:' not in response.content
+        ):
+            return response
+        if request.user.is_authenticated:
+            response.compress_key = None
+        content = fill(request, response.content.decode(response.charset))
+        response.content = content.encode(response.charset)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        return response
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
+
+
+@register('switcher')
+def switcher(request):
+    return render_to_string('includes/switcher.html', request=request)
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template.defaultfilters import date
+from django.urls import reverse
+from jinja2 import Environment
+from markupsafe import Markup
+from sorl.thumbnail import get_thumbnail
+
+from .holes import placeholder
+from .templatetags.user_filters import addclass
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args, kwargs=kwargs)
+
+
+def thumbnail(image, geometry, **options):
+    """Аналог тега {% thumbnail %}: миниатюра или None без картинки."""
+    if not image:
+        return None
+    return get_thumbnail(image, geometry, **options)
+
+
+def post_cards(posts, is_profile=False, is_group_list=False):
+    from posts.cards import render_cards
+
+    cards = render_cards(
+        posts,
+        using='jinja2',
+        is_profile=is_profile,
+        is_group_list=is_group_list,
+    )
+    return [Markup(card) for card in cards]
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({
+        'static': staticfiles_storage.url,
+        'url': url,
+        'thumbnail': thumbnail,
+        'post_cards': post_cards,
+        'hole': lambda name, *args: Markup(placeholder(name, *args)),
+        'year': lambda: datetime.now().year,
+    })
+    env.filters.update({
+        'addclass': addclass,
+        'date': date,
+    })
+    return env
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import prerender
+
+
+class Command(BaseCommand):
+    help = 'Заранее рендерит страницы «Об авторе» и страницы ошибок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=settings.PRERENDERED_ROOT)
+
+    def handle(self, *args, **options):
+        pages = prerender.build(options['root'])
+        self.stdout.write(
+            f'Собрано страниц: {len(pages)} в {options["root"]}.'
+        )
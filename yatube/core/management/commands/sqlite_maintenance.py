@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.db import active_aliases, maintain_sqlite
+
+
+class Command(BaseCommand):
+    help = 'Переносит WAL в файлы SQLite-баз и обновляет их статистику.'
+
+    def handle(self, *args, **options):
+        for alias in active_aliases():
+            connection = connections[alias]
+            if connection.vendor != 'sqlite':
+                continue
+            with connection.cursor() as cursor:
+                maintain_sqlite(cursor, 'TRUNCATE')
+            self.stdout.write(f'{connection.alias}: готово.')
@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в файлы реплик, которые заменяют '
+        'настоящую репликацию при локальной проверке роутера.'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены (YATUBE_REPLICAS).')
+        primary = connections['default'].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Команда работает только с SQLite.')
+        # uri=True, как у Django: тестовые базы в памяти заданы через file:.
+        source = sqlite3.connect(primary['NAME'], uri=True)
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(
+                    connections[alias].settings_dict['NAME'], uri=True
+                )
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: скопировано.')
+        finally:
+            source.close()
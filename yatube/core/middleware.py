@@ -0,0 +1,155 @@
+import hashlib
+import re
+import zlib
+
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES_RE = re.compile(
+    r'^(text/|application/(json|javascript|xml|rss\+xml|atom\+xml)|'
+    r'image/svg\+xml)'
+)
+MIN_LENGTH = 200
+COMPRESSED_CACHE_TIMEOUT = 5 * 60
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding с их весами q.
+
+    Кодировка с q=0 клиенту не подходит; «*» задаёт вес для всех,
+    что не названы явно.
+    """
+    weights = {}
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+def choose_encoding(request, encodings=None):
+    """Кодировка из encodings с наибольшим весом у клиента.
+
+    При равных весах побеждает та, что раньше в encodings.
+    """
+    if encodings is None:
+        encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    weights = accepted_encodings(request)
+    default = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, default)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressor(encoding):
+    if encoding == 'br':
+        return brotli.Compressor()
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress(encoding, data):
+    obj = compressor(encoding)
+    if encoding == 'br':
+        return obj.process(data) + obj.finish()
+    return obj.compress(data) + obj.flush()
+
+
+def compress_stream(encoding, chunks):
+    """Сжимает поток по частям, сразу отдавая готовые блоки клиенту."""
+    obj = compressor(encoding)
+    for chunk in chunks:
+        if encoding == 'br':
+            data = obj.process(chunk) + obj.flush()
+        else:
+            data = obj.compress(chunk) + obj.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield obj.finish() if encoding == 'br' else obj.flush()
+
+
+def compress_cached(encoding, content, cache_key):
+    """Сжатое тело ответа из общего кеша страниц или лент.
+
+    Вариант лежит рядом с исходной записью cache_key; хеш тела в ключе
+    не даёт отдать устаревший вариант после того, как запись сменилась.
+    """
+    digest = hashlib.md5(content).hexdigest()
+    key = f'compressed:{encoding}:{cache_key}:{digest}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress(encoding, content)
+        cache.set(key, compressed, COMPRESSED_CACHE_TIMEOUT)
+    return compressed
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает ответы brotli или gzip в зависимости от Accept-Encoding.
+
+    Сжатые варианты кешируются только для ответов с атрибутом
+    compress_key: его ставят общий кеш страниц и ленты, чьё тело
+    одинаково для всех. Остальные ответы сжимаются каждый раз.
+
+    Ответы с Accept-Ranges не сжимаются: диапазоны в них считаются по
+    несжатому файлу, и докачка склеила бы куски разных тел.
+    """
+
+    def process_response(self, request, response):
+        if (
+            response.status_code != 200
+            or response.has_header('Content-Encoding')
+            or response.get('Accept-Ranges', 'none') != 'none'
+            or not COMPRESSIBLE_TYPES_RE.match(
+                response.get('Content-Type', '')
+            )
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                encoding, response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            if len(response.content) < MIN_LENGTH:
+                return response
+            cache_key = getattr(response, 'compress_key', None)
+            if cache_key is None:
+                compressed = compress(encoding, response.content)
+            else:
+                compressed = compress_cached(
+                    encoding, response.content, cache_key
+                )
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,87 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.views.generic import TemplateView
+
+from .holes import fill
+
+PATH_MARKER = '__prerendered_path__'
+
+# Шаблон -> заполнять ли дыры при сборке. У страниц ошибок шапка
+# гостевая, чтобы их отдача не трогала ни сессию, ни базу.
+PAGES = {
+    'about/author.html': False,
+    'about/tech.html': False,
+    'core/403.html': True,
+    'core/403csrf.html': True,
+    'core/404.html': True,
+    'core/500.html': True,
+}
+
+pages = {}
+
+
+def build_request():
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = '/'
+    request.user = AnonymousUser()
+    return request
+
+
+def render_page(template_name, fill_holes):
+    request = build_request()
+    content = render_to_string(
+        template_name, {'path': PATH_MARKER}, request=request
+    )
+    if fill_holes:
+        content = fill(request, content)
+    return content.encode()
+
+
+def build(root=None):
+    """Рендерит все страницы в байты и, если указан каталог, пишет их туда."""
+    for template_name, fill_holes in PAGES.items():
+        pages[template_name] = render_page(template_name, fill_holes)
+        if root:
+            path = os.path.join(root, template_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(pages[template_name])
+    return pages
+
+
+def load():
+    """Загружает собранные при деплое страницы или рендерит недостающие."""
+    for template_name, fill_holes in PAGES.items():
+        path = os.path.join(settings.PRERENDERED_ROOT, template_name)
+        try:
+            with open(path, 'rb') as file:
+                pages[template_name] = file.read()
+        except FileNotFoundError:
+            pages[template_name] = render_page(template_name, fill_holes)
+    return pages
+
+
+def response(request, template_name, status=200):
+    if not pages:
+        load()
+    content = pages[template_name]
+    if PATH_MARKER.encode() in content:
+        content = content.replace(
+            PATH_MARKER.encode(), escape(request.path).encode()
+        )
+    return HttpResponse(content, status=status)
+
+
+class PrerenderedTemplateView(TemplateView):
+    """Страница без контекста, отдаваемая из заранее собранных байт."""
+
+    def get(self, request, *args, **kwargs):
+        if settings.PRERENDER_PAGES:
+            return response(request, self.template_name)
+        return super().get(request, *args, **kwargs)
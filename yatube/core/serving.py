@@ -0,0 +1,166 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .middleware import choose_encoding
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    """Возвращает (начало, конец) для одного диапазона из заголовка Range."""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError('Неудовлетворимый диапазон')
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, content_type=None, etag=None, encoding=None):
+    """Отдаёт файл с поддержкой условных запросов и заголовка Range."""
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(path):
+        raise Http404('Файл не найден')
+    etag = quote_etag(etag) if etag else file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = offloaded_response(path)
+    if response is None:
+        response = file_response(request, path, stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if content_type is None:
+        content_type, encoding = mimetypes.guess_type(path)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if response.status_code != 304:
+        response['Content-Type'] = content_type or 'application/octet-stream'
+    return response
+
+
+def offloaded_response(path):
+    """Передаёт отдачу файла веб-серверу, если это включено в настройках.
+
+    Range и повторная проверка условных заголовков в этом случае
+    выполняются самим веб-сервером.
+    """
+    backend = settings.SENDFILE_BACKEND
+    if backend == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+    if backend == 'x-accel-redirect':
+        for root, location in settings.SENDFILE_ACCEL_LOCATIONS.items():
+            root = os.path.join(os.path.abspath(root), '')
+            if path.startswith(root):
+                response = HttpResponse()
+                response['X-Accel-Redirect'] = location + os.path.relpath(
+                    path, root
+                ).replace(os.sep, '/')
+                return response
+    return None
+
+
+def file_response(request, path, stat, etag):
+    size = stat.st_size
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                read_range(path, start, length), status=206
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            return response
+    response = FileResponse(open(path, 'rb'))
+    response['Content-Length'] = str(size)
+    return response
+
+
+def resolve(root, path):
+    try:
+        return safe_join(root, path)
+    except ValueError:
+        raise Http404('Файл не найден')
+
+
+def serve_from(request, root, path):
+    return serve_file(request, resolve(root, path))
+
+
+def serve_precompressed(request, root, path):
+    """Отдаёт заранее сжатую копию файла, если клиент её принимает.
+
+    Файлы с хешем в имени кешируются клиентами навсегда.
+    """
+    full_path = resolve(root, path)
+    content_type, _ = mimetypes.guess_type(full_path)
+    suffixes = {
+        encoding: suffix for encoding, suffix in PRECOMPRESSED
+        if os.path.isfile(full_path + suffix)
+    }
+    encoding = choose_encoding(request, suffixes)
+    if encoding is None:
+        response = serve_file(request, full_path)
+    else:
+        response = serve_file(
+            request, full_path + suffixes[encoding], content_type,
+            encoding=encoding,
+        )
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if HASHED_NAME_RE.search(path):
+        response['Cache-Control'] = (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        )
+    return response
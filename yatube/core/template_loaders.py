@@ -0,0 +1,177 @@
+import os
+import re
+
+from django.template import (Origin, TemplateDoesNotExist, TemplateSyntaxError,
+                             engines)
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Node
+from django.template.defaulttags import IfNode
+from django.template.loader_tags import IncludeNode
+from django.template.loaders import base, cached
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+# Письма — простой текст в .html-файлах: переносы строк в них значимы.
+UNMINIFIED_TEMPLATE_RE = re.compile(r'(^|/)registration/|email')
+
+PRESERVED_RE = re.compile(
+    r'(<(pre|textarea|script|style)\b.*?</\2\s*>'
+    r'|{%\s*verbatim\s*%}.*?{%\s*endverbatim\s*%})',
+    re.IGNORECASE | re.DOTALL,
+)
+BETWEEN_TAGS_RE = re.compile(r'(>|%})[ \t]*\n\s*(?=<|{%)')
+LINE_BREAKS_RE = re.compile(r'[ \t]*\n\s*')
+PLACEHOLDER_RE = re.compile(r'<\x00(\d+)\x00>')
+
+
+def minify(source):
+    """Сжимает переносы строк и отступы между тегами до одного пробела.
+
+    Пробел остаётся, потому что между строчными элементами он виден.
+    Содержимое pre, textarea, script, style и verbatim не меняется,
+    пробелы внутри строки тоже остаются.
+    """
+    preserved = []
+
+    def hide(match):
+        preserved.append(match.group(0))
+        return f'<\x00{len(preserved) - 1}\x00>'
+
+    source = PRESERVED_RE.sub(hide, source)
+    source = BETWEEN_TAGS_RE.sub(r'\1 ', source)
+    source = LINE_BREAKS_RE.sub('\n', source)
+    return PLACEHOLDER_RE.sub(
+        lambda match: preserved[int(match.group(1))], source
+    )
+
+
+class InlinedIncludeNode(Node):
+    """{% include %} с шаблоном, найденным один раз при компиляции."""
+
+    def __init__(self, template, extra_context, isolated_context):
+        self.template = template
+        self.extra_context = extra_context
+        self.isolated_context = isolated_context
+
+    def render(self, context):
+        values = {
+            name: var.resolve(context)
+            for name, var in self.extra_context.items()
+        }
+        if self.isolated_context:
+            return self.template.render(context.new(values))
+        with context.push(**values):
+            return self.template.render(context)
+
+
+def child_nodelists(node):
+    if isinstance(node, IfNode):
+        return [nodelist for _, nodelist in node.conditions_nodelists]
+    return [
+        getattr(node, attr) for attr in node.child_nodelists
+        if getattr(node, attr, None) is not None
+    ]
+
+
+def constant_name(node):
+    name = node.template.var
+    if isinstance(name, str) and not node.template.filters:
+        return name
+    return None
+
+
+class Loader(cached.Loader):
+    """Кеширующий загрузчик, встраивающий include с постоянным именем.
+
+    Такой include больше не ищет шаблон при каждом рендере, например
+    на каждой итерации цикла по постам.
+    """
+
+    def get_template(self, template_name, skip=None):
+        template = super().get_template(template_name, skip)
+        if not getattr(template, 'includes_inlined', False):
+            template.includes_inlined = True
+            self.inline_includes(template.nodelist)
+        return template
+
+    def inline_includes(self, nodelist):
+        for index, node in enumerate(nodelist):
+            if isinstance(node, IncludeNode) and constant_name(node):
+                try:
+                    included = self.engine.get_template(constant_name(node))
+                except TemplateDoesNotExist:
+                    continue
+                inlined = InlinedIncludeNode(
+                    included, node.extra_context, node.isolated_context
+                )
+                inlined.token = node.token
+                inlined.origin = node.origin
+                nodelist[index] = inlined
+                continue
+            for child in child_nodelists(node):
+                self.inline_includes(child)
+
+
+def minified(template_name):
+    """Минифицируются только HTML-страницы, но не шаблоны писем."""
+    return (
+        template_name.endswith('.html')
+        and not UNMINIFIED_TEMPLATE_RE.search(template_name)
+    )
+
+
+class MinifyingLoader(base.Loader):
+    """Загрузчик, минифицирующий исходники HTML-шаблонов до компиляции."""
+
+    def __init__(self, engine, loaders):
+        self.loaders = engine.get_template_loaders(loaders)
+        super().__init__(engine)
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            for origin in loader.get_template_sources(template_name):
+                minified = Origin(origin.name, origin.template_name, self)
+                minified.source_loader = loader
+                yield minified
+
+    def get_contents(self, origin):
+        contents = origin.source_loader.get_contents(origin)
+        if not minified(origin.template_name):
+            return contents
+        return minify(contents)
+
+
+def template_names(directory):
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith(TEMPLATE_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, directory).replace(os.sep, '/')
+
+
+def loader_dirs(loaders):
+    for loader in loaders:
+        if hasattr(loader, 'loaders'):
+            yield from loader_dirs(loader.loaders)
+        elif hasattr(loader, 'get_dirs'):
+            yield from loader.get_dirs()
+
+
+def warmup():
+    """Компилирует все шаблоны и загружает библиотеки тегов заранее.
+
+    Вызывается при старте процесса, чтобы первые запросы не платили
+    за разбор шаблонов. Возвращает число скомпилированных шаблонов.
+    """
+    compiled = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        engine = backend.engine
+        for directory in loader_dirs(engine.template_loaders):
+            for name in template_names(directory):
+                try:
+                    engine.get_template(name)
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    continue
+                compiled += 1
+    return compiled
@@ -0,0 +1,157 @@
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .. import caches
+from ..caches import LRUCache, TieredCache
+
+
+class LRUCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches._stores.pop('test', None)
+        self.cache = LRUCache('test', {
+            'OPTIONS': {'MAX_BYTES': 3000, 'MAX_ITEM_BYTES': 1500},
+        })
+
+    def test_byte_budget_evicts_least_recent(self):
+        """При превышении бюджета вытесняются давно читанные записи."""
+        for name in ('a', 'b', 'c'):
+            self.cache.set(name, 'x' * 900)
+        self.cache.get('a')
+        self.cache.set('d', 'x' * 900)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 3)
+        self.assertLessEqual(stats['bytes'], 3000)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_oversized_rejected(self):
+        """Слишком большое значение не кешируется и не вытесняет другие."""
+        self.cache.set('small', 'x' * 100)
+        self.cache.set('small', 'x' * 2000)
+        self.assertIsNone(self.cache.get('small'))
+        self.cache.set('small', 'x' * 100)
+        self.assertFalse(self.cache.add('big', 'x' * 2000))
+        stats = self.cache.stats()
+        self.assertEqual(stats['rejected'], 2)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_cache_api(self):
+        """Сроки жизни, add, incr и delete ведут учёт байт."""
+        self.cache.set('short', 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertTrue(self.cache.touch('counter', 10))
+        self.cache.delete('counter')
+        self.assertEqual(self.cache.stats()['bytes'], 0)
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+
+    def make_cache(self, **options):
+        """Отдельный экземпляр как кеш другого процесса."""
+        caches._tiers.clear()
+        caches._tier_slots.clear()
+        return TieredCache(self.location, {'OPTIONS': options})
+
+    def test_shared_between_threads(self):
+        """Экземпляры одного процесса делят L1 и соединение с L2."""
+        cache = TieredCache(self.location, {})
+        self.assertIs(cache.l1, self.second.l1)
+        self.assertIs(cache.store, self.second.store)
+
+    def test_options_not_shared(self):
+        """Псевдоним с тем же LOCATION, но своими настройками не делит L1."""
+        small = TieredCache(self.location, {'OPTIONS': {'L1_MAX_BYTES': 10}})
+        self.assertIsNot(small.l1, self.second.l1)
+        self.assertEqual(small.l1.max_bytes, 10)
+        self.second.set('key', 1)
+        self.assertEqual(small.get('key'), 1)
+        with self.assertRaises(ImproperlyConfigured):
+            TieredCache(self.location, {'OPTIONS': {'GENERATION_SLOTS': 8}})
+
+    def test_shared_between_processes(self):
+        """Запись одного процесса видна другому через L2."""
+        self.first.set('key', {'value': 1})
+        self.assertEqual(self.second.get('key'), {'value': 1})
+        self.assertIsNone(self.second.get('missing'))
+
+    def test_l1_invalidated_by_generation(self):
+        """Запись и удаление в другом процессе сбрасывают L1."""
+        self.first.set('index_page', 'старая')
+        self.assertEqual(self.second.get('index_page'), 'старая')
+        self.assertIn(
+            self.second.make_key('index_page'), self.second.l1.entries
+        )
+        self.first.set('index_page', 'новая')
+        self.assertEqual(self.second.get('index_page'), 'новая')
+        self.first.delete('index_page')
+        self.assertIsNone(self.second.get('index_page'))
+        self.second.set('other', 1)
+        self.first.get('other')
+        self.second.clear()
+        self.assertIsNone(self.first.get('other'))
+
+    def test_l1_timeout(self):
+        """L1 держит значение не дольше L1_TIMEOUT."""
+        for timeout, hits in ((60, 1), (0, 0)):
+            with self.subTest(timeout=timeout):
+                cache = self.make_cache(L1_TIMEOUT=timeout)
+                cache.set('key', 1)
+                self.assertEqual(cache.get('key'), 1)
+                self.assertEqual(cache.get('key'), 1)
+                self.assertEqual(cache.l1.hits, hits)
+                self.assertEqual(cache.l1.misses, 2 - hits)
+        self.assertFalse(cache.l1.alive(cache.make_key('key')))
+
+    def test_cull_every(self):
+        """Лишние записи L2 чистятся на каждой CULL_EVERY-й записи."""
+        cache = self.make_cache(
+            MAX_ENTRIES=2, CULL_FREQUENCY=2, CULL_EVERY=4
+        )
+        for number in range(3):
+            cache.set(f'key{number}', number)
+        self.assertEqual(cache.stats()['l2_entries'], 3)
+        cache.set('key3', 3)
+        self.assertEqual(cache.stats()['l2_entries'], 2)
+
+    def test_expiry_add_incr(self):
+        """Сроки жизни, add и incr работают поверх общего файла."""
+        self.first.set('short', 1, timeout=0.05)
+        self.assertEqual(self.second.get('short'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(self.second.get('short'))
+        self.assertTrue(self.first.add('counter', 1))
+        self.assertFalse(self.second.add('counter', 5))
+        self.assertEqual(self.second.get('counter'), 1)
+        self.assertEqual(self.first.incr('counter', 2), 3)
+        self.assertEqual(self.second.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.second.incr('missing')
+
+
+class CacheStatsViewTest(TestCase):
+    def test_staff_only(self):
+        """Счётчики кеша видит только персонал."""
+        url = reverse('cache_stats')
+        user = get_user_model().objects.create(username='admin')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        user.is_staff = True
+        user.save()
+        stats = self.client.get(url).json()
+        self.assertIn('bytes', stats['default'])
@@ -0,0 +1,267 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.models import KVStore
+
+from posts.models import Comment, Follow, Post, User
+
+from ..db import AppRouter, ReplicaMiddleware, ReplicaRouter, replica_reads
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+SPLIT_APPS = {
+    'sessions': 'sessions',
+    'thumbnail': 'thumbnails',
+    'posts.follow': 'hot',
+    'posts.comment': 'hot',
+}
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.middleware = ReplicaMiddleware(lambda request: None)
+
+    def run_view(self, request, view):
+        used = []
+
+        def wrapped(request):
+            used.append(self.router.db_for_read(Post))
+            return view(request)
+
+        wrapped.__dict__.update(view.__dict__)
+        self.middleware.process_view(request, wrapped, (), {})
+        response = wrapped(request)
+        response = self.middleware.process_response(request, response)
+        return used[0], response
+
+    def test_read_views_use_replicas(self):
+        """Чтения помеченных view идут на реплики, прочих на primary."""
+        reader = replica_reads(lambda request: HttpResponse())
+        db, _ = self.run_view(self.factory.get('/'), reader)
+        self.assertIn(db, ('replica1', 'replica2'))
+        db, _ = self.run_view(
+            self.factory.get('/'), lambda request: HttpResponse()
+        )
+        self.assertEqual(db, 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_writer_sticks_to_primary(self):
+        """После записи чтения пользователя идут на primary."""
+        reader = replica_reads(lambda request: HttpResponse())
+        _, response = self.run_view(
+            self.factory.post('/'), lambda request: HttpResponse()
+        )
+        cookie = response.cookies['use_primary']
+        request = self.factory.get('/')
+        request.COOKIES['use_primary'] = cookie.value
+        db, _ = self.run_view(request, reader)
+        self.assertEqual(db, 'default')
+
+
+@override_settings(DATABASE_APPS=SPLIT_APPS)
+class AppRouterTest(SimpleTestCase):
+    def test_models_routed_to_own_databases(self):
+        """Сессии, миниатюры и горячие таблицы пишутся в свои базы."""
+        expected = {
+            Session: 'sessions',
+            KVStore: 'thumbnails',
+            Follow: 'hot',
+            Comment: 'hot',
+            Post: None,
+        }
+        for model, alias in expected.items():
+            with self.subTest(model=model):
+                self.assertEqual(AppRouter().db_for_read(model), alias)
+                self.assertEqual(AppRouter().db_for_write(model), alias)
+
+    def test_migrations_per_alias(self):
+        """В каждую отдельную базу мигрируют только её таблицы."""
+        expected = {
+            'sessions': {Session},
+            'thumbnails': {KVStore},
+            'hot': {Follow, Comment},
+        }
+        for alias, models in expected.items():
+            with self.subTest(alias=alias):
+                self.assertEqual({
+                    model for model in apps.get_models()
+                    if router.allow_migrate_model(alias, model)
+                }, models)
+        self.assertTrue(all(
+            router.allow_migrate_model('default', model)
+            for model in apps.get_models()
+        ))
+
+
+@override_settings(DATABASE_APPS=SPLIT_APPS, MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SplitDatabasesTest(TestCase):
+    """Сессии, миниатюры и горячие таблицы в настоящих отдельных базах."""
+
+    databases = {'default', 'sessions', 'thumbnails', 'hot'}
+
+    @classmethod
+    def setUpClass(cls):
+        # Рабочие соединения hot открываются без внешних ключей, а
+        # миграции тестовой базы включают их обратно. Внутри транзакции
+        # прагма не действует, поэтому она ставится до неё.
+        connections['hot'].disable_constraint_checking()
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['hot'].enable_constraint_checking()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(SplitDatabasesTest.reader)
+
+    def _should_check_constraints(self, connection):
+        # Комментарии и подписки в hot ссылаются на посты и
+        # пользователей из default.
+        if connection.alias == 'hot':
+            return False
+        return super()._should_check_constraints(connection)
+
+    def test_tables_per_alias(self):
+        """Миграции создают в каждой отдельной базе только её таблицы."""
+        expected = {
+            'sessions': {Session},
+            'thumbnails': {KVStore},
+            'hot': {Follow, Comment},
+        }
+        for alias, models in expected.items():
+            with self.subTest(alias=alias):
+                tables = set(connections[alias].introspection.table_names())
+                self.assertEqual(
+                    tables - {'django_migrations'},
+                    {model._meta.db_table for model in models},
+                )
+
+    def test_round_trip(self):
+        """Вход, подписка, комментарий и миниатюра пишутся в свои базы."""
+        post = SplitDatabasesTest.post
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['user'], SplitDatabasesTest.reader)
+        self.assertTrue(Session.objects.using('sessions').exists())
+        self.assertFalse(Session.objects.using('default').exists())
+
+        self.client.get(reverse('posts:profile_follow', args=['author']))
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'ответ'},
+        )
+        self.assertTrue(Follow.objects.using('hot').filter(
+            user=SplitDatabasesTest.reader, author=SplitDatabasesTest.author
+        ).exists())
+        self.assertFalse(Follow.objects.using('default').exists())
+        self.assertFalse(Comment.objects.using('default').exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['ответ'],
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+        thumbnail = get_thumbnail(post.image, '10x10')
+        cache.clear()
+        self.assertEqual(
+            get_thumbnail(post.image, '10x10').name, thumbnail.name
+        )
+        self.assertTrue(KVStore.objects.using('thumbnails').exists())
+        self.assertFalse(KVStore.objects.using('default').exists())
+
+    def test_deletes_reach_hot(self):
+        """Удаление поста и пользователя чистит их строки в hot."""
+        # Удаление обнуляет pk, а объекты класса общие для всех тестов.
+        post = Post.objects.get(pk=SplitDatabasesTest.post.pk)
+        reader = User.objects.get(pk=SplitDatabasesTest.reader.pk)
+        Comment.objects.create(post=post, author=reader, text='ответ')
+        Follow.objects.create(user=reader, author=SplitDatabasesTest.author)
+        Follow.objects.create(user=SplitDatabasesTest.author, author=reader)
+        post.delete()
+        self.assertFalse(Comment.objects.using('hot').exists())
+        reader.delete()
+        self.assertFalse(Follow.objects.using('hot').exists())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaDatabaseTest(TransactionTestCase):
+    """Роутер на настоящей реплике, которую наполняет sync_replicas.
+
+    TransactionTestCase нужен, чтобы sync_replicas из своего
+    соединения видел зафиксированные записи primary.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='старый')
+        call_command('sync_replicas', stdout=StringIO())
+
+    def test_marked_views_read_replica(self):
+        """Помеченный view читает с реплики, пока её не обновят."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        Post.objects.filter(pk=self.post.pk).update(
+            text='новый', updated_at=timezone.now()
+        )
+        self.assertEqual(
+            self.client.get(url).context['post'].text, 'старый'
+        )
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertEqual(self.client.get(url).context['post'].text, 'новый')
+
+    def test_sessions_and_users_from_primary(self):
+        """Вошедший после синхронизации не теряет сессию на реплике."""
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        self.assertFalse(
+            User.objects.using('replica').filter(pk=reader.pk).exists()
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertEqual(response.context['user'], reader)
@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+
+from .. import middleware
+from ..middleware import CompressionMiddleware
+
+BODY = '<p>Тестовый текст поста</p>\n' * 100
+
+
+class CompressionMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = CompressionMiddleware(lambda request: None)
+
+    def get_response(self, response, encoding='gzip'):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=encoding)
+        return self.middleware.process_response(request, response)
+
+    def test_gzip_page(self):
+        """HTML сжимается gzip, но без ключа общего кеша не кешируется."""
+        with mock.patch.object(middleware, 'compress_cached') as cached:
+            response = self.get_response(HttpResponse(BODY))
+        cached.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), BODY)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_shared_page_variant_cached(self):
+        """Сжатый вариант общей страницы лежит рядом с её ключом."""
+        response = HttpResponse(BODY)
+        response.compress_key = 'shared_page:test'
+        response = self.get_response(response)
+        digest = hashlib.md5(BODY.encode()).hexdigest()
+        self.assertEqual(
+            cache.get(f'compressed:gzip:shared_page:test:{digest}'),
+            response.content,
+        )
+
+    def test_streaming(self):
+        """Потоковый ответ сжимается по частям."""
+        response = self.get_response(
+            StreamingHttpResponse(iter([BODY.encode()] * 3))
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(content).decode(), BODY * 3)
+
+    def test_skip_ranged(self):
+        """Ответы с поддержкой Range отдаются несжатыми."""
+        response = StreamingHttpResponse(iter([BODY.encode()]))
+        response['Accept-Ranges'] = 'bytes'
+        response = self.get_response(response)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(
+            b''.join(response.streaming_content), BODY.encode()
+        )
+
+    def test_skip_images_and_identity(self):
+        """Картинки и клиенты без поддержки сжатия получают ответ как есть."""
+        response = self.get_response(
+            HttpResponse(b'x' * 1000, content_type='image/png')
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.get_response(HttpResponse(BODY), encoding='')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_quality_values(self):
+        """Веса q учитываются, а q=0 запрещает кодировку."""
+        cases = {
+            'gzip;q=0': None,
+            'br;q=0, gzip': 'gzip',
+            'br;q=0.5, gzip;q=0.8': 'gzip',
+            'br, gzip': 'br',
+            '*': 'br',
+            '*;q=0.1, gzip;q=0': 'br',
+            'gzipx, xbr': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                request = self.factory.get('/', HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(
+                    middleware.choose_encoding(request, ('br', 'gzip')),
+                    expected,
+                )
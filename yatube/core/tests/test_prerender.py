@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from posts.models import User
+
+from .. import prerender
+
+TEMP_PRERENDERED_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    PRERENDER_PAGES=True, PRERENDERED_ROOT=TEMP_PRERENDERED_ROOT
+)
+class PrerenderedPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PRERENDERED_ROOT, ignore_errors=True)
+        prerender.pages.clear()
+
+    def setUp(self):
+        prerender.pages.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_not_found_without_queries(self):
+        """404 отдаётся из готовых байт без обращений к базе."""
+        with self.assertNumQueries(0):
+            response = self.client.get('/missing/<b>/')
+        self.assertEqual(response.status_code, 404)
+        self.assertContains(
+            response, '/missing/&lt;b&gt;/', status_code=404
+        )
+        self.assertContains(response, 'Войти', status_code=404)
+
+    def test_about_keeps_user_header(self):
+        """На странице «Об авторе» шапка подставляется для пользователя."""
+        response = self.client.get('/about/author/')
+        self.assertContains(response, 'Привет, я автор')
+        self.assertContains(response, 'Пользователь: auth')
+
+    def test_command_writes_pages(self):
+        """Команда собирает страницы, а load() читает их с диска."""
+        call_command('prerender_pages', stdout=StringIO())
+        prerender.pages.clear()
+        with open(f'{TEMP_PRERENDERED_ROOT}/core/500.html', 'wb') as file:
+            file.write(b'<h1>from disk</h1>')
+        prerender.load()
+        self.assertEqual(
+            prerender.pages['core/500.html'], b'<h1>from disk</h1>'
+        )
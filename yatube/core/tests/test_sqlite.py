@@ -0,0 +1,40 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from .. import db
+
+
+class SqlitePragmasTest(TestCase):
+    def test_pragmas_applied(self):
+        """Новое соединение получает прагмы из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_maintenance_command(self):
+        """Команда обслуживания проходит по SQLite-базам."""
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('default: готово.', out.getvalue())
+
+    def test_maintenance_per_alias(self):
+        """Обслуживание одной базы не откладывает обслуживание другой."""
+        now = time.monotonic()
+        overdue = now - 2 * settings.SQLITE_MAINTENANCE_INTERVAL
+        other = mock.MagicMock(vendor='sqlite', alias='other')
+        state = {'default': now, 'other': overdue}
+        with mock.patch.object(db, 'maintain_sqlite') as maintain, \
+                mock.patch.dict(db.maintenance, state):
+            db.configure_sqlite(None, other)
+            maintain.assert_called_once()
+            self.assertGreater(db.maintenance['other'], overdue)
+            db.configure_sqlite(None, other)
+            maintain.assert_called_once()
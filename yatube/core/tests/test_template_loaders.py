@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory, TestCase
+
+from posts.models import Post, User
+
+from ..template_loaders import InlinedIncludeNode, minify, warmup
+
+
+def make_backend(loaders):
+    return DjangoTemplates({
+        'NAME': 'test',
+        'DIRS': [settings.TEMPLATES_DIR],
+        'APP_DIRS': False,
+        'OPTIONS': {'loaders': loaders},
+    })
+
+
+class InliningLoaderTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='test text')
+
+    def setUp(self):
+        self.backend = make_backend([
+            ('core.template_loaders.Loader', [
+                'django.template.loaders.filesystem.Loader',
+            ]),
+        ])
+        self.plain = make_backend([
+            'django.template.loaders.filesystem.Loader',
+        ])
+
+    def test_constant_includes_inlined(self):
+        """Include с постоянным именем заменяется готовым шаблоном."""
+        template = self.backend.get_template('posts/group_list.html')
+        nodes = template.template.nodelist.get_nodes_by_type(
+            InlinedIncludeNode
+        )
+        self.assertTrue(nodes)
+
+    def test_same_output(self):
+        """Встраивание не меняет результат рендера."""
+        context = {'page_obj': Post.objects.all(), 'group': 'g'}
+        request = RequestFactory().get('/')
+        request.user = InliningLoaderTest.user
+        self.assertEqual(
+            self.backend.get_template('posts/group_list.html').render(
+                context, request
+            ),
+            self.plain.get_template('posts/group_list.html').render(
+                context, request
+            ),
+        )
+
+    def test_warmup(self):
+        """Прогрев компилирует шаблоны проекта."""
+        self.assertGreater(warmup(), 0)
+
+
+class MinifyingLoaderTest(TestCase):
+    def test_minify(self):
+        """Пробелы между тегами сжимаются, pre и текст не меняются."""
+        source = (
+            '<ul>\n    <li>\n      Автор: {{ name }}\n    </li>\n'
+            '    {% if x %}\n      <b>a</b> <i>b</i>\n    {% endif %}\n'
+            '</ul>\n<a>1</a>\n<a>2</a>\n<pre>\n  код\n</pre>'
+        )
+        self.assertEqual(
+            minify(source),
+            '<ul> <li>\nАвтор: {{ name }}\n</li> {% if x %} <b>a</b> '
+            '<i>b</i> {% endif %} </ul> <a>1</a> <a>2</a> '
+            '<pre>\n  код\n</pre>',
+        )
+
+    def test_emails_not_minified(self):
+        """Письма и не-HTML шаблоны читаются как есть."""
+        backend = make_backend([('core.template_loaders.MinifyingLoader', [
+            'django.template.loaders.app_directories.Loader',
+        ])])
+        plain = make_backend([
+            'django.template.loaders.app_directories.Loader',
+        ])
+        for name in (
+            'registration/password_reset_email.html',
+            'registration/password_reset_subject.txt',
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    backend.get_template(name).template.source,
+                    plain.get_template(name).template.source,
+                )
+
+    def test_feed_rendered_smaller(self):
+        """Лента, собранная из минифицированных шаблонов, короче."""
+        user = User.objects.create_user(username='auth')
+        Post.objects.create(author=user, text='test  text\n  here')
+        context = {'page_obj': Post.objects.all(), 'group': 'g'}
+        request = RequestFactory().get('/')
+        request.user = user
+        html = {}
+        for loaders in (
+            ['django.template.loaders.filesystem.Loader'],
+            [('core.template_loaders.MinifyingLoader', [
+                'django.template.loaders.filesystem.Loader',
+            ])],
+        ):
+            template = make_backend(loaders).get_template(
+                'posts/group_list.html'
+            )
+            html[len(html)] = template.render(context, request)
+        self.assertLess(len(html[1]), len(html[0]))
+        self.assertIn('test  text\n  here', html[1])
@@ -0,0 +1,54 @@
+from django.test import TransactionTestCase
+
+from posts.models import Group
+
+from ..writer import GroupCommitWriter
+
+
+class GroupCommitWriterTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.writer = GroupCommitWriter(window=0.05, max_batch=10)
+
+    def create_group(self, slug, using='default'):
+        return Group.objects.using(using).create(
+            title=slug, slug=slug, description=''
+        )
+
+    def test_batch_committed_together(self):
+        """Записи из очереди выполняются потоком-писателем."""
+        futures = [
+            self.writer.submit('default', self.create_group, f'slug-{i}')
+            for i in range(5)
+        ]
+        groups = [future.result(5) for future in futures]
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(groups[0].slug, 'slug-0')
+
+    def test_failure_isolated(self):
+        """Ошибка одной записи не откатывает остальные из пачки."""
+        futures = [
+            self.writer.submit('default', self.create_group, slug)
+            for slug in ('first', 'first', 'second')
+        ]
+        self.assertEqual(futures[0].result(5).slug, 'first')
+        with self.assertRaises(Exception):
+            futures[1].result(5)
+        self.assertEqual(futures[2].result(5).slug, 'second')
+        self.assertEqual(Group.objects.count(), 2)
+
+    def test_retry_per_database(self):
+        """Пачка делится по базам, и повтор не дублирует записи другой."""
+        futures = [
+            self.writer.submit(
+                'replica', self.create_group, 'other', using='replica'
+            ),
+            self.writer.submit('default', self.create_group, 'first'),
+            self.writer.submit('default', self.create_group, 'first'),
+        ]
+        self.assertEqual(futures[0].result(5).slug, 'other')
+        self.assertEqual(futures[1].result(5).slug, 'first')
+        with self.assertRaises(Exception):
+            futures[2].result(5)
+        self.assertEqual(Group.objects.using('replica').count(), 1)
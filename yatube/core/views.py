@@ -1,17 +1,48 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import prerender
+from .serving import serve_from, serve_precompressed
+
+
+def error_page(request, template_name, status, context=None):
+    if settings.PRERENDER_PAGES:
+        return prerender.response(request, template_name, status)
+    return render(request, template_name, context, status=status)
+
 
 def page_not_found(request, exception):
-    return render(request, 'core/404.html', {'path': request.path}, status=404)
+    return error_page(request, 'core/404.html', 404, {'path': request.path})
 
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
+    return error_page(request, 'core/403csrf.html', 403)
 
 
 def server_error(request):
-    return render(request, 'core/500.html', status=500)
+    return error_page(request, 'core/500.html', 500)
 
 
 def permission_denied(request, exception):
-    return render(request, 'core/403.html', status=403)
+    return error_page(request, 'core/403.html', 403)
+
+
+def serve_media(request, path):
+    return serve_from(request, settings.MEDIA_ROOT, path)
+
+
+def serve_static(request, path):
+    return serve_precompressed(request, settings.STATIC_ROOT, path)
+
+
+@staff_member_required
+def cache_stats(request):
+    """Счётчики кешей этого процесса, у которых они есть."""
+    return JsonResponse({
+        alias: caches[alias].stats()
+        for alias in settings.CACHES
+        if hasattr(caches[alias], 'stats')
+    })
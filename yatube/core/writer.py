@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+class GroupCommitWriter:
+    """Один поток-писатель, объединяющий записи в общие транзакции.
+
+    Пачка делится по базам, и записи каждой базы идут в своей
+    транзакции. Если в ней что-то упало, она откатывается целиком и
+    операции повторяются по одной, чтобы ошибка одной не задела
+    соседей. Ожидающие запросы получают результат после коммита.
+    """
+
+    def __init__(self, window, max_batch):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, alias, func, *args, **kwargs):
+        future = Future()
+        self.queue.put((future, alias, func, args, kwargs))
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.loop, name='group-commit', daemon=True
+                )
+                self.thread.start()
+        return future
+
+    def collect(self):
+        """Первая запись из очереди и всё, что успело прийти за окно.
+
+        Пока пишется пачка, новые записи копятся в очереди, поэтому
+        окно нужно лишь чтобы подождать соседей по первой записи.
+        """
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or len(batch) > 1:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_batch(self, alias, batch):
+        close_old_connections()
+        with transaction.atomic(using=alias):
+            return [
+                func(*args, **kwargs) for _, _, func, args, kwargs in batch
+            ]
+
+    def loop(self):
+        while True:
+            by_alias = defaultdict(list)
+            for item in self.collect():
+                by_alias[item[1]].append(item)
+            for alias, batch in by_alias.items():
+                self.run_group(alias, batch)
+
+    def run_group(self, alias, batch):
+        try:
+            results = self.run_batch(alias, batch)
+        except Exception:
+            for item in batch:
+                self.run_single(item)
+            return
+        for (future, *_), result in zip(batch, results):
+            future.set_result(result)
+
+    def run_single(self, item):
+        future, alias, *_ = item
+        try:
+            result = self.run_batch(alias, [item])[0]
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+writer = None
+writer_lock = threading.Lock()
+
+
+def get_writer():
+    global writer
+    with writer_lock:
+        if writer is None:
+            writer = GroupCommitWriter(
+                settings.GROUP_COMMIT_WINDOW, settings.GROUP_COMMIT_MAX_BATCH
+            )
+    return writer
+
+
+def write(alias, func, *args, **kwargs):
+    """Запись в базу alias через общий поток-писатель или сразу.
+
+    База нужна писателю, чтобы открыть транзакцию там, куда func
+    на самом деле пишет, обычно это router.db_for_write модели.
+    """
+    if not settings.GROUP_COMMIT_WRITES:
+        return func(*args, **kwargs)
+    future = get_writer().submit(alias, func, *args, **kwargs)
+    return future.result(settings.GROUP_COMMIT_TIMEOUT)
@@ -0,0 +1,64 @@
+import time
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+CARD_TEMPLATE = 'includes/info.html'
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def version_key(kind, pk):
+    return f'card_version:{kind}:{pk}'
+
+
+def bump_version(kind, pk):
+    """Делает недействительными все карточки, зависящие от объекта."""
+    cache.set(version_key(kind, pk), time.time_ns(), None)
+
+
+def get_versions(kind, ids):
+    """Версии объектов; пропавшие из кеша версии создаются заново."""
+    keys = {version_key(kind, pk): pk for pk in ids if pk is not None}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {pk: found[key] for key, pk in keys.items()}
+
+
+def card_key(post, author_versions, group_versions, flags, using):
+    return 'post_card:{}:{}:{}:{}:{}:{}'.format(
+        using or 'django',
+        post.pk,
+        post.updated_at.timestamp(),
+        author_versions[post.author_id],
+        group_versions.get(post.group_id, 0),
+        ''.join('1' if flags[name] else '0' for name in sorted(flags)),
+    )
+
+
+def render_cards(posts, using=None, **flags):
+    """HTML карточек постов; готовые карточки берутся из кеша.
+
+    Ключ карточки включает время изменения поста и версии автора и
+    группы, поэтому заново рендерятся только изменившиеся карточки.
+    """
+    posts = list(posts)
+    author_versions = get_versions('author', {p.author_id for p in posts})
+    group_versions = get_versions('group', {p.group_id for p in posts})
+    keys = [
+        card_key(post, author_versions, group_versions, flags, using)
+        for post in posts
+    ]
+    cards = cache.get_many(keys)
+    rendered = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            rendered[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, **flags}, using=using
+            )
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [cards[key] for key in keys]
@@ -0,0 +1,222 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
+
+from . import sharding
+from .models import Group, Post, User
+
+FEED_SIZE = 20
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def version_key(scope):
+    return f'feed_version:{scope}'
+
+
+def bump_feed(scope):
+    """Сбрасывает закешированные ленты для сайта, группы или автора."""
+    cache.set(version_key(scope), time.time_ns(), None)
+
+
+def get_version(scope):
+    version = cache.get(version_key(scope))
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key(scope), version, None)
+    return version
+
+
+class SiteFeed(Feed):
+    """Лента сайта; ссылки в лентах строятся от SITE_URL.
+
+    Feed сам дописал бы к ним хост запроса, и первый хост, на котором
+    лента попала в кеш, достался бы всем остальным.
+    """
+
+    title = 'Последние обновления на сайте'
+    description = 'Новые посты всех авторов'
+    url_name = 'posts:site_rss'
+
+    def get_object(self, request):
+        return None
+
+    def scope(self, obj):
+        return 'site'
+
+    def queryset(self, obj):
+        return Post.objects.all()
+
+    def url_args(self, obj):
+        return ()
+
+    def feed_url(self, obj):
+        return settings.SITE_URL + reverse(
+            self.url_name, args=self.url_args(obj)
+        )
+
+    def link(self, obj):
+        return settings.SITE_URL + reverse('posts:index')
+
+    def items(self, obj):
+        """Посты ленты по списку id, который кешируется с её версией.
+
+        Список собирается из всех шардов, а посты по нему читаются
+        одним in_bulk на шард.
+        """
+        key = f'feed_ids:{self.scope(obj)}:{get_version(self.scope(obj))}'
+        ids = cache.get(key)
+        if ids is None:
+            # Менеджер связи читает id автора и группы у каждой строки,
+            # поэтому они не откладываются.
+            latest = sharding.scatter(
+                self.queryset(obj).order_by('-pub_date', '-pk')
+                .only('pk', 'pub_date', 'author_id', 'group_id')
+            )
+            ids = [post.pk for post in latest[:FEED_SIZE]]
+            cache.set(key, ids, FEED_CACHE_TIMEOUT)
+        posts = sharding.in_bulk(
+            Post.objects.select_related('author', 'group'), ids
+        )
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def item_title(self, item):
+        return str(item)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return settings.SITE_URL + reverse(
+            'posts:post_detail', args=(item.pk,)
+        )
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_categories(self, item):
+        return (item.group.title,) if item.group else ()
+
+    def __call__(self, request, *args, **kwargs):
+        """Ленту отдаёт кеш до следующего изменения её постов.
+
+        Last-Modified считается по уже собранным записям ленты, чтобы
+        не читать её посты второй раз.
+        """
+        obj = self.get_object(request, *args, **kwargs)
+        scope = self.scope(obj)
+        key = 'feed:{}:{}:{}:{}'.format(
+            type(self).__name__, scope, get_version(scope), request.path
+        )
+        cached = cache.get(key)
+        if cached is None:
+            feed = self.get_feed(obj, request)
+            last_modified = max(
+                (int(item['updateddate'].timestamp()) for item in feed.items),
+                default=None,
+            )
+            cached = (
+                feed.writeString('utf-8').encode(),
+                feed.content_type,
+                last_modified,
+            )
+            cache.set(key, cached, FEED_CACHE_TIMEOUT)
+        content, content_type, last_modified = cached
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+            response.compress_key = key
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class GroupFeed(SiteFeed):
+    url_name = 'posts:group_rss'
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def scope(self, obj):
+        return f'group:{obj.pk}'
+
+    def url_args(self, obj):
+        return (obj.slug,)
+
+    def queryset(self, obj):
+        return obj.posts.all()
+
+    def title(self, obj):
+        return obj.title
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return settings.SITE_URL + reverse(
+            'posts:group_list', args=(obj.slug,)
+        )
+
+
+class AuthorFeed(SiteFeed):
+    url_name = 'posts:author_rss'
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def scope(self, obj):
+        return f'author:{obj.pk}'
+
+    def url_args(self, obj):
+        return (obj.username,)
+
+    def queryset(self, obj):
+        return obj.posts.all()
+
+    def title(self, obj):
+        return f'Все посты пользователя {obj.get_full_name() or obj}'
+
+    def description(self, obj):
+        return self.title(obj)
+
+    def link(self, obj):
+        return settings.SITE_URL + reverse(
+            'posts:profile', args=(obj.username,)
+        )
+
+
+class AtomMixin:
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+
+class SiteAtomFeed(AtomMixin, SiteFeed):
+    url_name = 'posts:site_atom'
+
+
+class GroupAtomFeed(AtomMixin, GroupFeed):
+    url_name = 'posts:group_atom'
+
+
+class AuthorAtomFeed(AtomMixin, AuthorFeed):
+    url_name = 'posts:author_atom'
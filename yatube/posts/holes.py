@@ -0,0 +1,19 @@
+from django.template.loader import render_to_string
+
+from core.holes import register
+
+from .models import Follow
+
+
+@register('follow_button')
+def follow_button(request, username, author_id):
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author_id=author_id
+        ).exists()
+    )
+    return render_to_string(
+        'includes/follow_button.html',
+        {'username': username, 'following': following},
+    )
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image
+
+FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg'),
+    'webp': ('webp', 'image/webp'),
+    'png': ('png', 'image/png'),
+}
+MAX_WIDTH = 2048
+DEFAULT_QUALITY = 85
+SIGNATURE_SALT = 'posts.images.variant'
+
+
+def sign(name, width, quality, fmt):
+    value = f'{name}:{width}:{quality}:{fmt}'
+    return salted_hmac(SIGNATURE_SALT, value).hexdigest()[:20]
+
+
+def check_signature(signature, name, width, quality, fmt):
+    return constant_time_compare(signature, sign(name, width, quality, fmt))
+
+
+def variant_url(name, width, quality=DEFAULT_QUALITY, fmt='jpeg'):
+    """Подписанный адрес картинки поста нужной ширины, качества и формата."""
+    return reverse('posts:image_variant', kwargs={
+        'signature': sign(name, width, quality, fmt),
+        'width': width,
+        'quality': quality,
+        'fmt': fmt,
+        'name': name,
+    })
+
+
+def render_variant(source_path, width, quality, fmt):
+    with Image.open(source_path) as image:
+        image.thumbnail((width, image.height))
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+class VariantCache:
+    """Дисковый LRU-кеш вариантов картинок с ограничением по объёму.
+
+    Свежесть записи отмечается временем изменения файла: при попадании
+    оно обновляется, а при переполнении удаляются самые старые файлы.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total = None
+        self.lock = threading.Lock()
+
+    def path(self, key, ext):
+        return os.path.join(self.root, key[:2], f'{key}.{ext}')
+
+    def get(self, key, ext):
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, ext, data):
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for _, size, _ in self.entries())
+            else:
+                self.total += len(data)
+            if self.total > self.max_bytes:
+                self.evict()
+        return path
+
+    def entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        self.total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self.total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total -= size
+
+
+_caches = {}
+
+
+def get_variant_cache():
+    options = (
+        settings.IMAGE_VARIANTS_ROOT, settings.IMAGE_VARIANTS_MAX_BYTES
+    )
+    if options not in _caches:
+        _caches[options] = VariantCache(*options)
+    return _caches[options]
+
+
+def get_variant(source_path, width, quality, fmt):
+    """Ключ и путь варианта картинки, при необходимости создаёт его."""
+    ext, _ = FORMATS[fmt]
+    stat = os.stat(source_path)
+    key = hashlib.sha1(
+        f'{source_path}:{stat.st_mtime_ns}:{width}:{quality}:{fmt}'.encode()
+    ).hexdigest()
+    cache = get_variant_cache()
+    path = cache.get(key, ext)
+    if path is None:
+        data = render_variant(source_path, width, quality, fmt)
+        path = cache.put(key, ext, data)
+    return key, path
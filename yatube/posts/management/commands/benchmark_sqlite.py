@@ -0,0 +1,109 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, router
+from django.test.utils import override_settings
+
+from core.writer import write
+
+from posts import sharding
+from posts.models import Comment, Post
+
+BENCH_TEXT = 'benchmark_sqlite'
+
+
+class Command(BaseCommand):
+    help = 'Меряет скорость чтения ленты, пока в базу пишут комментарии.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--no-pragmas', action='store_true',
+            help='Замер со стандартным журналом вместо WAL и прагм.',
+        )
+        parser.add_argument(
+            '--group-commit', action='store_true',
+            help='Писать через общий поток-писатель.',
+        )
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author').first()
+        if post is None:
+            raise CommandError('Нужен хотя бы один пост.')
+        overrides = {}
+        if options['no_pragmas']:
+            overrides['SQLITE_PRAGMAS'] = {'journal_mode': 'delete'}
+        overrides['GROUP_COMMIT_WRITES'] = options['group_commit']
+        connections.close_all()
+        with override_settings(**overrides):
+            reads, writes, errors, crashes = self.run(post, options)
+        connections.close_all()
+        for comments in sharding.per_shard(
+            Comment.objects.filter(text=BENCH_TEXT)
+        ):
+            comments.delete()
+        if crashes:
+            raise CommandError(f'Поток замера упал: {crashes[0]!r}')
+        seconds = options['seconds']
+        self.stdout.write(
+            f'Чтений/с: {reads / seconds:.1f}, записей/с: '
+            f'{writes / seconds:.1f}, ошибок блокировки: {errors}.'
+        )
+
+    def loop(self, kind, action):
+        done = failed = 0
+        try:
+            while not self.stop.is_set():
+                try:
+                    action()
+                    done += 1
+                except OperationalError:
+                    failed += 1
+                except Exception as error:
+                    # Иначе поток молча умрёт, а замер покажет ноль.
+                    with self.lock:
+                        self.crashes.append(error)
+                    self.stop.set()
+        finally:
+            connection.close()
+            with self.lock:
+                self.counts[kind] += done
+                self.counts['errors'] += failed
+
+    def run(self, post, options):
+        self.stop = threading.Event()
+        self.counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        self.crashes = []
+        self.lock = threading.Lock()
+
+        def read():
+            list(Post.objects.select_related('author', 'group')[:10])
+
+        def write_comment():
+            comment = Comment(
+                post=post, author_id=post.author_id, text=BENCH_TEXT
+            )
+            write(
+                router.db_for_write(Comment, instance=comment), comment.save
+            )
+
+        threads = [
+            threading.Thread(target=self.loop, args=('reads', read))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=self.loop, args=('writes', write_comment))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        counts = self.counts
+        return (
+            counts['reads'], counts['writes'], counts['errors'], self.crashes
+        )
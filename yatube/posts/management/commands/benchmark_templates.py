@@ -0,0 +1,70 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+
+FEEDS = (
+    ('posts/index.html', {}),
+    ('posts/group_list.html', {'is_group_list': True}),
+    ('posts/profile.html', {'is_profile': True}),
+    ('posts/follow.html', {}),
+)
+ENGINES = ('django', 'jinja2')
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def make_page(size):
+    """Страница из несохранённых постов, чтобы не зависеть от базы."""
+    now = timezone.now()
+    author = User(pk=1, username='bench', first_name='Лев', last_name='Т')
+    group = Group(pk=1, title='Группа', slug='group', description='...')
+    posts = [
+        Post(
+            pk=i, text=f'Текст поста {i} ' * 20, pub_date=now,
+            updated_at=now, author=author, group=group,
+        )
+        for i in range(1, size * 3 + 1)
+    ]
+    return author, group, Paginator(posts, size).get_page(2)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время рендера лент в шаблонах Django и Jinja2.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        author, group, page_obj = make_page(options['page_size'])
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        base_context = {
+            'page_obj': page_obj, 'author': author, 'group': group,
+        }
+        self.stdout.write('шаблон, движок: мс на рендер без кеша карточек')
+        with override_settings(CACHES=DUMMY_CACHES):
+            for name, extra in FEEDS:
+                context = {**base_context, **extra}
+                for engine in ENGINES:
+                    template = get_template(name, using=engine)
+                    elapsed = self.measure(
+                        template, context, request, options['repeat']
+                    )
+                    self.stdout.write(f'{name}, {engine}: {elapsed:.3f}')
+
+    def measure(self, template, context, request, repeat):
+        template.render(context, request)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            template.render(context, request)
+        return (time.perf_counter() - started) * 1000 / repeat
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает все шарды карты сайта, например после смены '
+        'SITE_URL.'
+    )
+
+    def handle(self, *args, **options):
+        count = sitemaps.build_all()
+        self.stdout.write(f'Собрано шардов: {count}.')
@@ -0,0 +1,158 @@
+import heapq
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts import sharding
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+def walk_sorted(root, prefix=''):
+    """Отдаёт (имя, размер) файлов каталога в лексикографическом порядке."""
+    try:
+        entries = list(os.scandir(os.path.join(root, prefix)))
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda e: e.name + '/' if e.is_dir() else e.name)
+    for entry in entries:
+        name = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_sorted(root, name + '/')
+        elif entry.is_file(follow_symlinks=False):
+            yield name, entry.stat().st_size
+
+
+def sorted_difference(files, referenced):
+    """Слиянием двух отсортированных потоков отдаёт файлы без ссылок."""
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for name, size in files:
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if current != name:
+            yield name, size
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT картинки, на которые не ссылается ни один '
+        'пост ни в одном шарде, вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько места освободится.',
+        )
+        parser.add_argument(
+            '--quarantine', metavar='DIR',
+            help='Переносить файлы в DIR внутри MEDIA_ROOT вместо удаления.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.quarantine = options['quarantine']
+        self.removed = 0
+        self.reclaimed = 0
+        batch_size = options['batch_size']
+
+        upload_to = Post._meta.get_field('image').upload_to
+        images = (
+            Post.objects.exclude(image='')
+            .order_by('image')
+            .values_list('image', flat=True)
+        )
+        referenced = heapq.merge(*(
+            queryset.iterator(chunk_size=batch_size)
+            for queryset in sharding.per_shard(images)
+        ))
+        originals = self.skip_quarantine(
+            walk_sorted(settings.MEDIA_ROOT, upload_to)
+        )
+        for batch in batched(
+            sorted_difference(originals, referenced), batch_size
+        ):
+            self.process_originals(batch)
+
+        thumbnails = self.skip_quarantine(walk_sorted(
+            settings.MEDIA_ROOT, thumbnail_settings.THUMBNAIL_PREFIX
+        ))
+        for batch in batched(thumbnails, batch_size):
+            self.process_thumbnails(batch)
+
+        verb = 'Будет освобождено' if self.dry_run else 'Освобождено'
+        self.stdout.write(
+            f'{verb} {self.reclaimed} байт, файлов: {self.removed}.'
+        )
+
+    def skip_quarantine(self, files):
+        if not self.quarantine:
+            return files
+        prefix = self.quarantine.strip('/') + '/'
+        return (item for item in files if not item[0].startswith(prefix))
+
+    def process_originals(self, batch):
+        for name, size in batch:
+            image_file = ImageFile(name, default.storage)
+            thumbnail_keys = default.kvstore._get(
+                image_file.key, identity='thumbnails'
+            ) or []
+            for key in thumbnail_keys:
+                thumbnail = default.kvstore._get(key)
+                if thumbnail is not None and thumbnail.exists():
+                    self.discard(thumbnail.name, thumbnail.storage.size(
+                        thumbnail.name
+                    ))
+            self.discard(name, size)
+            if not self.dry_run:
+                default.kvstore.delete(image_file, delete_thumbnails=False)
+                default.kvstore._delete_raw(
+                    *(add_prefix(key) for key in thumbnail_keys)
+                )
+
+    def process_thumbnails(self, batch):
+        """Убирает миниатюры, о которых не знает хранилище sorl-thumbnail."""
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key): (name, size)
+            for name, size in batch
+        }
+        known = set(
+            KVStore.objects.filter(key__in=keys).values_list('key', flat=True)
+        )
+        for key, (name, size) in keys.items():
+            if key not in known:
+                self.discard(name, size)
+
+    def discard(self, name, size):
+        self.removed += 1
+        self.reclaimed += size
+        if self.dry_run:
+            self.stdout.write(f'{name} ({size} байт)')
+            return
+        if self.quarantine:
+            os.renames(
+                os.path.join(settings.MEDIA_ROOT, name),
+                os.path.join(settings.MEDIA_ROOT, self.quarantine, name),
+            )
+        else:
+            default.storage.delete(name)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты и комментарии пользователя в JSONL, CSV или zip.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='jsonl'
+        )
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Упаковать выгрузку и картинки постов в zip.',
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки, по умолчанию stdout.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        fmt = options['format']
+        if options['images']:
+            if not options['output']:
+                raise CommandError('Для zip нужен --output.')
+            with open(options['output'], 'wb') as file:
+                for chunk in export.export_zip(user, fmt):
+                    file.write(chunk)
+        elif options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.writelines(export.export_lines(user, fmt))
+        else:
+            for line in export.export_lines(user, fmt):
+                self.stdout.write(line, ending='')
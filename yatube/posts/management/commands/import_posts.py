@@ -0,0 +1,321 @@
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import ExitStack
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.dateparse import parse_datetime
+
+from core.holes import bump_shared_pages
+from posts import sharding, sitemaps
+from posts.feeds import bump_feed
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import preserved_dates
+
+BATCH_SIZE = 1000
+POST_IDS_SIZE = 100000
+
+
+def read_records(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise CommandError(f'Строка {number}: неверный JSON.')
+
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково импортирует посты, комментарии и подписки из JSONL '
+        'пачками через bulk_create, раскладывая посты по шардам авторов. '
+        'На время импорта в базы не должны писать другие процессы: id '
+        'новых записей выдаются заранее. Комментарий находит пост, только '
+        'если тот среди последних --post-ids-size импортированных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл JSONL, по умолчанию stdin.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--post-ids-size', type=int, default=POST_IDS_SIZE,
+            help='Сколько последних постов помнить для их комментариев.',
+        )
+        parser.add_argument(
+            '--author', help='Автор записей, в которых он не указан.'
+        )
+        parser.add_argument(
+            '--images', metavar='DIR',
+            help='Каталог, относительно которого ищутся картинки постов.',
+        )
+
+    def handle(self, *args, **options):
+        self.default_author = options['author']
+        self.images = options['images']
+        self.users = {}
+        self.groups = {}
+        self.post_ids = OrderedDict()
+        self.post_ids_size = options['post_ids_size']
+        self.last_ids = {}
+        self.counts = dict.fromkeys(('post', 'comment', 'follow', 'skip'), 0)
+        started = time.monotonic()
+        stream = (
+            sys.stdin if options['path'] == '-'
+            else open(options['path'], encoding='utf-8')
+        )
+        try:
+            with preserved_dates():
+                for batch in batches(
+                    read_records(stream), options['batch_size']
+                ):
+                    self.import_batch(batch)
+                    self.report(started)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.reset_sequences()
+        self.report(started)
+
+    def report(self, started):
+        total = sum(self.counts.values()) - self.counts['skip']
+        rate = total / max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            'Импортировано {total}: постов {post}, комментариев {comment}, '
+            'подписок {follow}, пропущено {skip}; {rate:.1f} записей/с.'
+            .format(total=total, rate=rate, **self.counts)
+        )
+
+    def resolve_users(self, usernames):
+        missing = {name for name in usernames if name not in self.users}
+        if not missing:
+            return
+        self.users.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'pk')
+        )
+        new = missing - self.users.keys()
+        if new:
+            password = make_password(None)
+            User.objects.bulk_create(
+                User(username=name, password=password) for name in new
+            )
+            self.users.update(
+                User.objects.filter(username__in=new)
+                .values_list('username', 'pk')
+            )
+
+    def resolve_groups(self, slugs):
+        missing = {slug for slug in slugs if slug not in self.groups}
+        if not missing:
+            return
+        self.groups.update(
+            Group.objects.filter(slug__in=missing).values_list('slug', 'pk')
+        )
+        new = missing - self.groups.keys()
+        if new:
+            Group.objects.bulk_create(
+                Group(title=slug, slug=slug, description='') for slug in new
+            )
+            self.groups.update(
+                Group.objects.filter(slug__in=new).values_list('slug', 'pk')
+            )
+
+    def author(self, record, key='author'):
+        return self.users.get(record.get(key) or self.default_author)
+
+    def import_batch(self, batch):
+        self.resolve_users(
+            record.get(key) or self.default_author
+            for record in batch for key in ('author', 'user')
+            if record.get(key) or self.default_author
+        )
+        self.resolve_groups(
+            record['group'] for record in batch if record.get('group')
+        )
+        writes = defaultdict(list)
+        follows = []
+        for record in batch:
+            kind = record.get('type')
+            if kind == 'post' and self.author(record):
+                try:
+                    alias, post = self.build_post(record)
+                except SuspiciousFileOperation as error:
+                    self.stderr.write(f'Пост пропущен: {error}')
+                    self.counts['skip'] += 1
+                    continue
+                writes[Post, alias].append(post)
+            elif kind == 'comment' and self.author(record) and (
+                self.find_post(record.get('post'))
+            ):
+                alias, comment = self.build_comment(record)
+                writes[Comment, alias].append(comment)
+            elif kind == 'follow' and self.author(record) and (
+                self.author(record, 'user')
+            ):
+                follows.append(Follow(
+                    user_id=self.author(record, 'user'),
+                    author_id=self.author(record),
+                ))
+            else:
+                self.counts['skip'] += 1
+        follows = self.new_follows(follows)
+        writes[Follow, router.db_for_write(Follow)].extend(follows)
+        self.write(writes)
+        posts = [
+            post for (model, _), rows in writes.items() if model is Post
+            for post in rows
+        ]
+        self.counts['post'] += len(posts)
+        if posts:
+            self.bump_feeds(posts)
+        self.counts['comment'] += sum(
+            len(rows) for (model, _), rows in writes.items()
+            if model is Comment
+        )
+        self.counts['follow'] += len(follows)
+
+    def write(self, writes):
+        """Пишет пачку во все её базы, фиксируя их вместе в конце."""
+        with ExitStack() as stack:
+            for alias in dict.fromkeys(alias for _, alias in writes):
+                stack.enter_context(transaction.atomic(using=alias))
+            for (model, alias), rows in writes.items():
+                model.objects.using(alias).bulk_create(rows)
+
+    def bump_feeds(self, posts):
+        """Сбрасывает ленты, страницы и карту сайта раз на пачку."""
+        bump_shared_pages()
+        sitemaps.bump_posts(post.pk for post in posts)
+        bump_feed('site')
+        for author_id in {post.author_id for post in posts}:
+            bump_feed(f'author:{author_id}')
+        for group_id in {post.group_id for post in posts} - {None}:
+            bump_feed(f'group:{group_id}')
+
+    def next_id(self, model, alias):
+        """Следующий id модели из диапазона базы alias."""
+        if (model, alias) not in self.last_ids:
+            self.last_ids[model, alias] = sharding.last_id(model, alias)
+        self.last_ids[model, alias] += 1
+        return self.last_ids[model, alias]
+
+    def build_post(self, record):
+        image = self.attach_image(record.get('image'))
+        author_id = self.author(record)
+        alias = (
+            sharding.shard_for_author(author_id) if sharding.enabled()
+            else router.db_for_write(Post)
+        )
+        pk = self.next_id(Post, alias)
+        if record.get('id') is not None:
+            self.remember_post(record['id'], pk, alias)
+        date = parse_datetime(record.get('date') or '') or timezone.now()
+        return alias, Post(
+            pk=pk,
+            text=record.get('text', ''),
+            pub_date=date,
+            updated_at=date,
+            author_id=author_id,
+            group_id=self.groups.get(record.get('group')),
+            image=image,
+        )
+
+    def remember_post(self, record_id, pk, alias):
+        """Запоминает id поста, вытесняя давно не нужные.
+
+        Комментарии в выгрузке обычно идут следом за своими постами,
+        поэтому хватает последних post_ids_size постов, и память не
+        растёт с размером импорта.
+        """
+        self.post_ids[record_id] = pk, alias
+        self.post_ids.move_to_end(record_id)
+        while len(self.post_ids) > self.post_ids_size:
+            self.post_ids.popitem(last=False)
+
+    def find_post(self, record_id):
+        """Новый id и база поста из выгрузки или None."""
+        found = self.post_ids.get(record_id)
+        if found is not None:
+            self.post_ids.move_to_end(record_id)
+        return found
+
+    def build_comment(self, record):
+        post_id, alias = self.post_ids[record['post']]
+        if not sharding.enabled():
+            alias = router.db_for_write(Comment)
+        return alias, Comment(
+            pk=self.next_id(Comment, alias),
+            post_id=post_id,
+            author_id=self.author(record),
+            text=record.get('text', ''),
+            created=parse_datetime(record.get('date') or '')
+            or timezone.now(),
+        )
+
+    def attach_image(self, name):
+        """Копирует картинку в upload_to поля image.
+
+        Имя, выходящее за каталог картинок или MEDIA_ROOT, вызывает
+        SuspiciousFileOperation, и пост пропускается.
+        """
+        if not name or not self.images:
+            return ''
+        path = safe_join(self.images, name)
+        if not os.path.isfile(path):
+            return ''
+        with open(path, 'rb') as file:
+            return default_storage.save(
+                Post.image.field.generate_filename(None, name), File(file)
+            )
+
+    def new_follows(self, follows):
+        """Подписки без дублей и без подписок на себя."""
+        pairs = {
+            (follow.user_id, follow.author_id) for follow in follows
+            if follow.user_id != follow.author_id
+        }
+        existing = set(
+            Follow.objects.filter(
+                user_id__in={user for user, _ in pairs},
+                author_id__in={author for _, author in pairs},
+            ).values_list('user_id', 'author_id')
+        ) if pairs else set()
+        self.counts['skip'] += len(follows) - len(pairs - existing)
+        return [
+            Follow(user_id=user, author_id=author)
+            for user, author in pairs - existing
+        ]
+
+    def reset_sequences(self):
+        for model, alias in self.last_ids:
+            connection = connections[alias]
+            statements = connection.ops.sequence_reset_sql(
+                no_style(), [model]
+            )
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
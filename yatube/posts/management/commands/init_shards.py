@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import sharding
+from posts.models import AuthorShard, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт таблицы в шардах из YATUBE_SHARDS, выставляет диапазоны '
+        'id и записывает в справочник авторов уже лежащих там постов.'
+    )
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('Шарды не настроены (YATUBE_SHARDS).')
+        known = set(AuthorShard.objects.values_list('author_id', flat=True))
+        aliases = list(dict.fromkeys(['default', *settings.POST_SHARDS]))
+        for alias in aliases[1:]:
+            call_command('migrate', database=alias, verbosity=0)
+        for alias in aliases:
+            if alias in settings.POST_SHARDS:
+                if connections[alias].vendor == 'sqlite':
+                    sharding.seed_sequences(alias)
+                else:
+                    self.stderr.write(
+                        f'{alias}: диапазон id нужно задать вручную.'
+                    )
+            author_ids = set(
+                Post.objects.using(alias).order_by()
+                .values_list('author_id', flat=True).distinct()
+            ) - known
+            AuthorShard.objects.bulk_create(
+                AuthorShard(author_id=author_id, alias=alias)
+                for author_id in author_ids
+            )
+            known |= author_ids
+            self.stdout.write(f'{alias}: новых авторов {len(author_ids)}.')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import prefetch
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько прогретых страниц лент понадобилось.'
+
+    def handle(self, *args, **options):
+        stats = prefetch.stats()
+        self.stdout.write(
+            'Прогрето: {prefetched}, использовано: {used}, '
+            'впустую: {wasted}.'.format(**stats)
+        )
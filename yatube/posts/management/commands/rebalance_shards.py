@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding
+from posts.models import AuthorShard, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит авторов между шардами: одного по имени или '
+        'автоматически, выравнивая число постов в шардах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', help='Имя переносимого автора.')
+        parser.add_argument('--to', help='Шард, куда перенести автора.')
+        parser.add_argument(
+            '--auto', action='store_true',
+            help='Перенести авторов из лишних баз и выровнять шарды.',
+        )
+        parser.add_argument('--max-moves', type=int, default=100)
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('Шарды не настроены (YATUBE_SHARDS).')
+        if options['auto']:
+            self.rebalance(options['max_moves'])
+        elif options['author'] and options['to']:
+            if options['to'] not in settings.POST_SHARDS:
+                raise CommandError('Такого шарда нет в YATUBE_SHARDS.')
+            try:
+                author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError('Пользователь не найден.')
+            self.move(author.pk, options['to'])
+        else:
+            raise CommandError('Нужен --auto или --author вместе с --to.')
+
+    def move(self, author_id, target):
+        moved = sharding.move_author(author_id, target)
+        self.stdout.write(f'Автор {author_id}: {moved} постов в {target}.')
+        return moved
+
+    def rebalance(self, max_moves):
+        loads = sharding.shard_loads()
+        totals = {alias: sum(loads[alias].values()) for alias in loads}
+        stray = AuthorShard.objects.exclude(alias__in=settings.POST_SHARDS)
+        for author_id in stray.values_list('author_id', flat=True):
+            target = min(totals, key=totals.get)
+            loads[target][author_id] = self.move(author_id, target)
+            totals[target] += loads[target][author_id]
+        for _ in range(max_moves):
+            source = max(totals, key=totals.get)
+            target = min(totals, key=totals.get)
+            gap = totals[source] - totals[target]
+            candidates = [
+                (abs(gap - 2 * count), author_id, count)
+                for author_id, count in loads[source].items()
+                if abs(gap - 2 * count) < gap
+            ]
+            if not candidates:
+                break
+            _, author_id, count = min(candidates)
+            self.move(author_id, target)
+            loads[target][author_id] = loads[source].pop(author_id)
+            totals[source] -= count
+            totals[target] += count
+        self.stdout.write(', '.join(
+            f'{alias}: {total}' for alias, total in totals.items()
+        ))
@@ -0,0 +1,142 @@
+import heapq
+import os
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from posts import sharding
+from posts.models import Post
+from posts.utils import THUMBNAIL_GEOMETRY, THUMBNAIL_OPTIONS
+
+CHUNK_SIZE = 100
+
+
+def rebuild(task):
+    """Пересоздаёт миниатюру одной картинки, вызывается в процессе пула."""
+    name, geometry, options, force = task
+    image_file = ImageFile(name, default.storage)
+    if not image_file.exists():
+        return False
+    if force:
+        default.kvstore.delete_thumbnails(image_file)
+    get_thumbnail(image_file, geometry, **options)
+    return True
+
+
+def chunks(last_pk, chunk_size):
+    """Отдаёт (id, картинка) постов всех шардов порциями по возрастанию id.
+
+    Каждая порция читается отдельным запросом к каждому шарду, чтобы
+    открытый курсор не держал блокировку SQLite, пока процессы пула
+    пишут миниатюры. id уникальны во всех шардах, поэтому порции
+    сливаются по id, и файл с последним id продолжает работу.
+    """
+    images = Post.objects.exclude(image='').order_by('pk')
+    while True:
+        chunk = list(islice(heapq.merge(*(
+            list(
+                queryset.filter(pk__gt=last_pk)
+                .values_list('pk', 'image')[:chunk_size]
+            )
+            for queryset in sharding.per_shard(images)
+        )), chunk_size))
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1][0]
+
+
+def read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(f.read().strip() or 0)
+
+
+def write_checkpoint(path, pk):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(str(pk))
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    help = 'Пересоздаёт миниатюры картинок всех постов в пуле процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--geometry', default=THUMBNAIL_GEOMETRY)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов, по умолчанию по числу ядер.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--checkpoint', metavar='FILE',
+            help='Файл с последним обработанным id поста для продолжения.',
+        )
+        parser.add_argument(
+            '--max-rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Удалять существующие миниатюры перед созданием.',
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        chunk_size = options['chunk_size']
+        max_rate = options['max_rate']
+        task_options = (
+            options['geometry'], THUMBNAIL_OPTIONS, options['force']
+        )
+
+        done = 0
+        started = time.monotonic()
+        pool = None
+        if options['workers'] > 1:
+            connections.close_all()
+            pool = Pool(options['workers'])
+        try:
+            for chunk in chunks(read_checkpoint(checkpoint), chunk_size):
+                done += self.process(pool, chunk, task_options)
+                self.finish_chunk(checkpoint, chunk, done, started)
+                if max_rate:
+                    self.throttle(done, started, max_rate)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.stdout.write(
+            f'Готово: {done} картинок, '
+            f'{self.rate(done, started):.1f} картинок/с.'
+        )
+
+    def process(self, pool, chunk, task_options):
+        tasks = [(name,) + task_options for _, name in chunk]
+        if pool is None:
+            results = map(rebuild, tasks)
+        else:
+            results = pool.imap_unordered(rebuild, tasks)
+        return sum(results)
+
+    def finish_chunk(self, checkpoint, chunk, done, started):
+        if checkpoint:
+            write_checkpoint(checkpoint, chunk[-1][0])
+        self.stdout.write(
+            f'id <= {chunk[-1][0]}: {done} картинок, '
+            f'{self.rate(done, started):.1f} картинок/с.'
+        )
+
+    def throttle(self, done, started, max_rate):
+        delay = done / max_rate - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def rate(self, done, started):
+        return done / max(time.monotonic() - started, 1e-9)
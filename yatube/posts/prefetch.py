@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .cards import render_cards
+
+PREFETCH_TIMEOUT = 60
+COUNTERS = ('prefetched', 'used')
+
+lock = threading.Lock()
+pending = set()
+executor = None
+
+
+def marker_key(key):
+    return f'prefetch:{key}'
+
+
+def counter_key(name):
+    return f'prefetch_stats:{name}'
+
+
+def count(name):
+    cache.add(counter_key(name), 0, None)
+    cache.incr(counter_key(name))
+
+
+def warm(key, loader, total, flags):
+    try:
+        posts = list(loader())
+        render_cards(posts, **flags)
+        cache.set(
+            marker_key(key),
+            {'ids': [post.pk for post in posts], 'count': total},
+            PREFETCH_TIMEOUT,
+        )
+        count('prefetched')
+    finally:
+        with lock:
+            pending.discard(key)
+        if settings.PREFETCH_WORKERS:
+            # Загрузчик мог открыть соединения с шардами и репликами.
+            connections.close_all()
+
+
+def schedule(key, loader, total=None, **flags):
+    """Прогревает следующую страницу ленты в фоне.
+
+    Кроме карточек запоминаются id постов страницы и total, число
+    постов в ленте, чтобы переход на неё не повторял запросы. Одна и
+    та же страница не ставится в очередь дважды, пока она в работе
+    или пока её прогрев не истёк.
+    """
+    global executor
+    if not settings.PREFETCH_FEEDS:
+        return
+    with lock:
+        if key in pending or cache.get(marker_key(key)) is not None:
+            return
+        pending.add(key)
+        if settings.PREFETCH_WORKERS and executor is None:
+            executor = ThreadPoolExecutor(settings.PREFETCH_WORKERS)
+    if settings.PREFETCH_WORKERS:
+        executor.submit(warm, key, loader, total, flags)
+    else:
+        warm(key, loader, total, flags)
+
+
+def take(key):
+    """Прогретая страница ({'ids': ..., 'count': ...}) или None.
+
+    Страница отдаётся один раз и считается использованной.
+    """
+    if not settings.PREFETCH_FEEDS:
+        return None
+    prefetched = cache.get(marker_key(key))
+    if prefetched is not None:
+        cache.delete(marker_key(key))
+        count('used')
+    return prefetched
+
+
+def stats():
+    values = cache.get_many([counter_key(name) for name in COUNTERS])
+    result = {name: values.get(counter_key(name), 0) for name in COUNTERS}
+    result['wasted'] = result['prefetched'] - result['used']
+    return result
@@ -0,0 +1,357 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Max
+
+from .models import AuthorShard, Comment, Post, User
+from .utils import preserved_dates
+
+SHARD_ID_SPAN = 10 ** 12
+SHARD_CACHE_TIMEOUT = 60
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def author_key(author_id):
+    return f'author_shard:{author_id}'
+
+
+def post_key(post_id):
+    return f'post_shard:{post_id}'
+
+
+def shard_for_author(author_id):
+    """База, где лежат посты автора.
+
+    Справочник AuthorShard хранится в default. Новому автору шард
+    выбирается по остатку от id и сразу записывается в справочник,
+    чтобы rebalance_shards мог потом перенести автора куда угодно.
+    """
+    key = author_key(author_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = (
+            AuthorShard.objects.using('default')
+            .filter(author_id=author_id)
+            .values_list('alias', flat=True)
+            .first()
+        )
+        if alias is None:
+            shards = settings.POST_SHARDS
+            alias = shards[author_id % len(shards)]
+            AuthorShard.objects.using('default').get_or_create(
+                author_id=author_id, defaults={'alias': alias}
+            )
+        cache.set(key, alias, SHARD_CACHE_TIMEOUT)
+    return alias
+
+
+def locate(post_id):
+    """База, где лежит пост, или None, если поста нигде нет.
+
+    Сначала проверяется шард, выдавший id, потом остальные: после
+    переноса автора пост живёт не там, где был создан.
+    """
+    key = post_key(post_id)
+    alias = cache.get(key)
+    if alias is not None:
+        return alias
+    shards = list(settings.POST_SHARDS)
+    origin = post_id // SHARD_ID_SPAN
+    if origin < len(shards):
+        shards.insert(0, shards.pop(origin))
+    for alias in shards:
+        if Post.objects.using(alias).filter(pk=post_id).exists():
+            cache.set(key, alias, SHARD_CACHE_TIMEOUT)
+            return alias
+    return None
+
+
+def post_queryset(post_id):
+    """Менеджер постов в базе, где лежит пост с этим id."""
+    if not enabled():
+        return Post.objects.all()
+    alias = locate(post_id)
+    if alias is None:
+        return Post.objects.none()
+    return Post.objects.using(alias)
+
+
+def without_joins(queryset):
+    """select_related в шарде не работает: авторы и группы лежат в default.
+
+    Связи подгружаются отдельными запросами через prefetch_related.
+    """
+    related = queryset.query.select_related
+    if not isinstance(related, dict):
+        return queryset
+    return queryset.select_related(None).prefetch_related(*related)
+
+
+def for_author(queryset, author_id):
+    """Посты одного автора читаются из одного шарда."""
+    if not enabled():
+        return queryset
+    return without_joins(queryset).using(shard_for_author(author_id))
+
+
+def per_shard(queryset, aliases=None):
+    """Тот же запрос в каждом шарде; без шардинга только он сам."""
+    if not enabled():
+        return [queryset]
+    queryset = without_joins(queryset)
+    return [
+        queryset.using(alias)
+        for alias in (settings.POST_SHARDS if aliases is None else aliases)
+    ]
+
+
+def author_aliases(author_ids):
+    """Шарды авторов author_ids; None, если ограничения нет."""
+    if author_ids is None or not enabled():
+        return None
+    return sorted({shard_for_author(pk) for pk in author_ids})
+
+
+def scatter(queryset, author_ids=None):
+    """Запрос ко всем шардам (или только к шардам авторов author_ids).
+
+    Каждый шард отдаёт уже отсортированную порцию, MergedPosts сливает
+    их по дате, не загружая шарды целиком.
+    """
+    if not enabled():
+        return queryset
+    return MergedPosts(per_shard(queryset, author_aliases(author_ids)))
+
+
+def in_bulk(queryset, ids):
+    """in_bulk по всем шардам, собранный в один словарь."""
+    found = {}
+    for part in per_shard(queryset):
+        found.update(part.in_bulk(ids))
+    return found
+
+
+class MergedPosts:
+    """Посты из нескольких шардов как один упорядоченный список.
+
+    Поддерживает то, что нужно пагинатору и keyset_page: count(),
+    срезы, filter() и order_by() по полям с одним направлением.
+    """
+
+    ordered = True
+
+    def __init__(self, querysets, ordering=('-pub_date', '-pk')):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def clone(self, method, *args, **kwargs):
+        return MergedPosts(
+            [getattr(qs, method)(*args, **kwargs) for qs in self.querysets],
+            self.ordering,
+        )
+
+    def filter(self, *args, **kwargs):
+        return self.clone('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self.clone('exclude', *args, **kwargs)
+
+    def prefetch_related(self, *lookups):
+        return self.clone('prefetch_related', *lookups)
+
+    def order_by(self, *ordering):
+        merged = self.clone('order_by', *ordering)
+        merged.ordering = ordering
+        return merged
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def sort_key(self, post):
+        return tuple(
+            getattr(post, name.lstrip('-')) for name in self.ordering
+        )
+
+    def merge(self, limit=None):
+        querysets = [qs.order_by(*self.ordering) for qs in self.querysets]
+        if limit is not None:
+            querysets = [qs[:limit] for qs in querysets]
+        return heapq.merge(
+            *querysets,
+            key=self.sort_key,
+            reverse=self.ordering[0].startswith('-'),
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is not None or index.stop is None:
+                return list(self.merge())[index]
+            start = index.start or 0
+            return list(islice(self.merge(index.stop), start, index.stop))
+        return list(islice(self.merge(index + 1), index, index + 1))[0]
+
+    def __iter__(self):
+        return iter(self.merge())
+
+    def __len__(self):
+        return self.count()
+
+
+class ShardRouter:
+    """Посты и комментарии живут в шарде автора поста.
+
+    Без подсказки instance роутер молчит, и решение принимает
+    следующий роутер, поэтому общие запросы идут через scatter().
+    """
+
+    def route(self, model, instance):
+        if not enabled() or instance is None:
+            return None
+        if isinstance(instance, Post):
+            return shard_for_author(instance.author_id)
+        if isinstance(instance, Comment):
+            if Comment.post.is_cached(instance):
+                return shard_for_author(instance.post.author_id)
+            return locate(instance.post_id)
+        if isinstance(instance, User) and model is Post:
+            return shard_for_author(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if model in (Post, Comment):
+            return self.route(model, hints.get('instance'))
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def configure_shard(sender, connection, **kwargs):
+    """В шарде нет пользователей и групп, поэтому внешние ключи выключены."""
+    if (
+        connection.vendor == 'sqlite'
+        and connection.alias != 'default'
+        and connection.alias in settings.POST_SHARDS
+    ):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+
+
+def id_range(alias):
+    """Полуинтервал id, которые выдаёт шард alias."""
+    start = settings.POST_SHARDS.index(alias) * SHARD_ID_SPAN
+    return start, start + SHARD_ID_SPAN
+
+
+def last_id(model, alias):
+    """Последний выданный id модели из диапазона шарда alias.
+
+    Перенесённые посты сохраняют свои id, поэтому максимум ищется во
+    всех шардах, а не только в alias. Без шардинга это просто
+    наибольший id в базе alias.
+    """
+    if not enabled():
+        return model.objects.using(alias).aggregate(pk=Max('pk'))['pk'] or 0
+    start, stop = id_range(alias)
+    return max(
+        model.objects.using(shard).filter(pk__gte=start, pk__lt=stop)
+        .aggregate(pk=Max('pk'))['pk'] or start
+        for shard in settings.POST_SHARDS
+    )
+
+
+def seed_sequences(alias):
+    """Ставит счётчики id шарда в его собственный диапазон.
+
+    У каждого шарда свой диапазон SHARD_ID_SPAN, так что id постов и
+    комментариев не пересекаются. Перенесённые строки с чужими id
+    сдвигают счётчик SQLite, поэтому он пересчитывается по id из
+    диапазона шарда, где бы эти строки ни лежали.
+    """
+    with connections[alias].cursor() as cursor:
+        for model in (Post, Comment):
+            table = model._meta.db_table
+            seq = last_id(model, alias)
+            cursor.execute(
+                'DELETE FROM sqlite_sequence WHERE name = %s', [table]
+            )
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                [table, seq],
+            )
+
+
+def delete_author(author_id, skip=None):
+    """Удаляет посты автора и все его комментарии из шардов.
+
+    Каскад удаления пользователя идёт только в базе skip, а в шардах
+    внешних ключей нет. Посты ищутся во всех шардах: после прерванного
+    переноса копия могла остаться и в старом.
+    """
+    ids = []
+    for alias in settings.POST_SHARDS:
+        if alias == skip:
+            continue
+        posts = Post.objects.using(alias).filter(author_id=author_id)
+        ids += posts.values_list('pk', flat=True)
+        posts.delete()
+        Comment.objects.using(alias).filter(author_id=author_id).delete()
+    cache.delete_many([author_key(author_id)] + [post_key(pk) for pk in ids])
+
+
+def shard_loads():
+    """Число постов каждого автора по шардам."""
+    loads = {}
+    for alias in settings.POST_SHARDS:
+        rows = (
+            Post.objects.using(alias).order_by()
+            .values_list('author_id').annotate(posts=Count('id'))
+        )
+        loads[alias] = dict(rows)
+    return loads
+
+
+def move_author(author_id, target, chunk_size=500):
+    """Переносит посты автора и комментарии к ним в шард target.
+
+    Строки копируются с прежними id и датами, затем удаляются из
+    старого шарда. Транзакция в target фиксируется первой, а
+    справочник меняется последним, так что сбой посередине оставляет
+    копию, но не теряет посты. Другие процессы узнают о переносе не
+    позже чем через SHARD_CACHE_TIMEOUT. Возвращает число перенесённых
+    постов.
+    """
+    source = shard_for_author(author_id)
+    if source == target:
+        return 0
+    ids = list(
+        Post.objects.using(source).filter(author_id=author_id)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    with preserved_dates(), transaction.atomic(using=source), \
+            transaction.atomic(using=target):
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            Post.objects.using(target).bulk_create(
+                Post.objects.using(source).filter(pk__in=chunk)
+            )
+            Comment.objects.using(target).bulk_create(
+                Comment.objects.using(source).filter(post_id__in=chunk)
+            )
+            Post.objects.using(source).filter(pk__in=chunk).delete()
+        if connections[target].vendor == 'sqlite':
+            seed_sequences(target)
+    AuthorShard.objects.using('default').update_or_create(
+        author_id=author_id, defaults={'alias': target}
+    )
+    cache.delete_many([author_key(author_id)] + [post_key(pk) for pk in ids])
+    return len(ids)
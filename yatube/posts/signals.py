@@ -0,0 +1,79 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.db import split_alias
+from core.holes import bump_shared_pages
+
+from . import sharding, sitemaps
+from .cards import bump_version
+from .feeds import bump_feed
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    """Сбрасывает карточки и ленты автора; вход на сайт их не меняет."""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version('author', instance.pk)
+    bump_feed(f'author:{instance.pk}')
+    bump_shared_pages()
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_version('group', instance.pk)
+    bump_feed(f'group:{instance.pk}')
+    bump_shared_pages()
+
+
+@receiver(pre_save, sender=Post)
+def post_moving(sender, instance, using, **kwargs):
+    """Запоминает прежнюю группу, чтобы сбросить и её ленту."""
+    if instance.pk:
+        instance.previous_group_id = (
+            Post.objects.using(using).filter(pk=instance.pk)
+            .values_list('group_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    bump_shared_pages()
+    sitemaps.bump_posts([instance.pk])
+    bump_feed('site')
+    bump_feed(f'author:{instance.author_id}')
+    for group_id in {
+        instance.group_id, getattr(instance, 'previous_group_id', None)
+    }:
+        if group_id is not None:
+            bump_feed(f'group:{group_id}')
+
+
+def delete_split(model, using, condition):
+    """Удаляет строки модели из её отдельной базы.
+
+    Каскад идёт в базе удаляемого объекта и видит там только пустую
+    таблицу, поэтому строки в отдельной базе удаляются вручную.
+    """
+    alias = split_alias(model._meta.app_label, model._meta.model_name)
+    if alias is not None and alias != using:
+        model.objects.using(alias).filter(condition).delete()
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, using, **kwargs):
+    delete_split(Comment, using, Q(post_id=instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    if sharding.enabled():
+        sharding.delete_author(instance.pk, skip=using)
+    delete_split(Comment, using, Q(author_id=instance.pk))
+    delete_split(
+        Follow, using, Q(user_id=instance.pk) | Q(author_id=instance.pk)
+    )
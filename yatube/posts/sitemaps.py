@@ -0,0 +1,247 @@
+import gzip
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.html import escape
+
+from . import sharding
+from .models import Post
+
+SHARD_SIZE = 50000
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def shard_path(shard):
+    return os.path.join(settings.SITEMAP_ROOT, f'posts-{shard}.xml.gz')
+
+
+def manifest_path():
+    return os.path.join(settings.SITEMAP_ROOT, 'manifest.json')
+
+
+def version_key(shard):
+    return f'sitemap_version:{shard}'
+
+
+def get_version(shard):
+    version = cache.get(version_key(shard))
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key(shard), version, None)
+    return version
+
+
+def write_atomic(path, write):
+    """Пишет файл во временный и подменяет им path."""
+    os.makedirs(settings.SITEMAP_ROOT, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_manifest():
+    """Шарды карты сайта в порядке номеров.
+
+    Шард — страница из SHARD_SIZE постов по возрастанию id внутри
+    одного диапазона id (при шардинге базы у каждой базы свой).
+    start — начало диапазона, after и last — границы id шарда (last
+    None у последнего, ещё не заполненного шарда диапазона), built —
+    версия, с которой собран файл.
+    """
+    try:
+        with open(manifest_path(), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def save_manifest(shards):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(shards, file)
+
+    write_atomic(manifest_path(), write)
+
+
+def id_ranges():
+    """Начало и конец (или None) каждого диапазона id постов."""
+    if not sharding.enabled():
+        return [(0, None)]
+    return [sharding.id_range(alias) for alias in settings.POST_SHARDS]
+
+
+def range_start(pk):
+    return pk // sharding.SHARD_ID_SPAN * sharding.SHARD_ID_SPAN
+
+
+def shard_posts(shard, stop):
+    """Посты шарда по возрастанию id во всех базах."""
+    posts = Post.objects.filter(pk__gt=shard['after']).order_by('pk')
+    if shard['last'] is not None:
+        posts = posts.filter(pk__lte=shard['last'])
+    elif stop is not None:
+        posts = posts.filter(pk__lt=stop)
+    return posts
+
+
+def shard_rows(shard, stop, *fields):
+    """Строки постов шарда из всех баз, слитые по возрастанию id."""
+    posts = shard_posts(shard, stop).values_list('pk', *fields)
+    return islice(heapq.merge(*(
+        queryset.iterator(chunk_size=2000)
+        for queryset in sharding.per_shard(posts)
+    )), SHARD_SIZE)
+
+
+def overflows(shard, stop):
+    """Больше ли в открытом шарде SHARD_SIZE постов.
+
+    Каждая база считает не дальше SHARD_SIZE + 1 строк, так что
+    проверка не зависит от размера сайта.
+    """
+    posts = shard_posts(shard, stop)
+    return sum(
+        queryset[:SHARD_SIZE + 1].count()
+        for queryset in sharding.per_shard(posts)
+    ) > SHARD_SIZE
+
+
+def new_shard(start, after):
+    return {'start': start, 'after': after, 'last': None, 'built': None}
+
+
+def refresh_manifest():
+    """Закрывает переполненные шарды и открывает за ними новые.
+
+    Граница шарда ищется по ключу: следующий шард начинается после
+    последнего id предыдущего, без OFFSET по всей таблице. Номера
+    уже выданных шардов не меняются, новые дописываются в конец.
+    """
+    shards = load_manifest()
+    changed = False
+    for start, stop in id_ranges():
+        own = [shard for shard in shards if shard['start'] == start]
+        if not own:
+            shard = new_shard(start, start - 1)
+            if next(shard_rows(shard, stop), None) is None:
+                continue
+            shards.append(shard)
+            own.append(shard)
+            changed = True
+        while overflows(own[-1], stop):
+            last = deque(shard_rows(own[-1], stop), maxlen=1)[0][0]
+            own[-1]['last'] = last
+            shard = new_shard(start, last)
+            shards.append(shard)
+            own.append(shard)
+            changed = True
+    if changed:
+        save_manifest(shards)
+    return shards
+
+
+def bump_posts(pks):
+    """Помечает устаревшими шарды, в которые попадают посты pks.
+
+    Вызывается из сигналов постов и из импорта, который пишет
+    bulk_create без сигналов. Пост, которому ещё нет шарда, подберёт
+    refresh_manifest.
+    """
+    shards = load_manifest()
+    stale = set()
+    for pk in pks:
+        for number, shard in enumerate(shards):
+            if (
+                shard['start'] == range_start(pk)
+                and shard['after'] < pk
+                and (shard['last'] is None or pk <= shard['last'])
+            ):
+                stale.add(number)
+                break
+    for number in stale:
+        cache.set(version_key(number), time.time_ns(), None)
+
+
+def write_shard(number, shard):
+    """Пишет шард на диск в gzip.
+
+    Посты читаются по возрастанию id потоком от границы шарда, поэтому
+    ни шард, ни его запрос не зависят от того, насколько глубоко он
+    лежит.
+    """
+    stop = dict(id_ranges()).get(shard['start'])
+    rows = shard_rows(shard, stop, 'updated_at')
+
+    def write(path):
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            file.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<urlset xmlns="{SITEMAP_NS}">\n'
+            )
+            for pk, updated_at in rows:
+                location = escape(settings.SITE_URL + reverse(
+                    'posts:post_detail', args=(pk,)
+                ))
+                file.write(
+                    f'<url><loc>{location}</loc><lastmod>'
+                    f'{updated_at.date().isoformat()}</lastmod></url>\n'
+                )
+            file.write('</urlset>\n')
+
+    write_atomic(shard_path(number), write)
+
+
+def build(numbers, shards):
+    """Собирает шарды numbers и записывает их версии в манифест.
+
+    Версия берётся до сборки: правка во время сборки оставит шард
+    устаревшим, и он пересоберётся при следующем запросе.
+    """
+    versions = {number: get_version(number) for number in numbers}
+    for number in numbers:
+        write_shard(number, shards[number])
+    shards = load_manifest()
+    for number, version in versions.items():
+        shards[number]['built'] = version
+    save_manifest(shards)
+
+
+def get_shard(number):
+    """Путь к готовому шарду; пересобираются только изменившиеся."""
+    shards = refresh_manifest()
+    if not 0 <= number < len(shards):
+        return None
+    if (
+        shards[number]['built'] != get_version(number)
+        or not os.path.exists(shard_path(number))
+    ):
+        build([number], shards)
+    return shard_path(number)
+
+
+def build_all():
+    shards = refresh_manifest()
+    build(range(len(shards)), shards)
+    return len(shards)
+
+
+def render_index():
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<sitemapindex xmlns="{SITEMAP_NS}">',
+    ]
+    for number in range(len(refresh_manifest())):
+        location = escape(
+            settings.SITE_URL + reverse('posts:sitemap_shard', args=(number,))
+        )
+        lines.append(f'<sitemap><loc>{location}</loc></sitemap>')
+    lines.append('</sitemapindex>')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,24 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cards import render_cards
+from ..images import DEFAULT_QUALITY, variant_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_variant(image, width, quality=DEFAULT_QUALITY, fmt='jpeg'):
+    if not image:
+        return ''
+    return variant_url(image.name, width, quality, fmt)
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    cards = render_cards(
+        posts,
+        is_profile=context.get('is_profile', False),
+        is_group_list=context.get('is_group_list', False),
+    )
+    return [mark_safe(card) for card in cards]
@@ -1,7 +1,16 @@
+from io import StringIO
+
+from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import holes
 
-from ..models import Post, User
+from .. import cards, prefetch
+from ..models import Follow, Group, Post, User
 
 
 class CacheTest(TestCase):
@@ -26,3 +35,189 @@ class CacheTest(TestCase):
         cache.clear
         response_2 = self.guest_client.get('/')
         self.assertEqual(response.content, response_2.content)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test-slug',
+            description='test description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='test text',
+            group=cls.group,
+        )
+        cls.url = reverse('posts:profile', kwargs={'username': 'auth'})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_card_cached_until_post_changed(self):
+        """Карточка берётся из кеша, пока пост не изменился."""
+        self.guest_client.get(PostCardCacheTest.url)
+        Post.objects.filter(pk=PostCardCacheTest.post.pk).update(
+            text='changed quietly'
+        )
+        response = self.guest_client.get(PostCardCacheTest.url)
+        self.assertContains(response, 'test text')
+        post = Post.objects.get(pk=PostCardCacheTest.post.pk)
+        post.save()
+        response = self.guest_client.get(PostCardCacheTest.url)
+        self.assertContains(response, 'changed quietly')
+
+    def test_card_invalidated_by_group_and_author(self):
+        """Изменение группы или автора обновляет карточку."""
+        self.guest_client.get(PostCardCacheTest.url)
+        group = PostCardCacheTest.group
+        group.title = 'renamed group'
+        group.save()
+        response = self.guest_client.get(PostCardCacheTest.url)
+        self.assertContains(response, 'renamed group')
+        user = PostCardCacheTest.user
+        user.first_name = 'Новое'
+        user.last_name = 'Имя'
+        user.save()
+        response = self.guest_client.get(PostCardCacheTest.url)
+        self.assertContains(response, 'Новое Имя')
+
+    def test_login_keeps_author_cards(self):
+        """Вход автора на сайт не сбрасывает его карточки."""
+        user = PostCardCacheTest.user
+        version = cards.get_versions('author', [user.pk])
+        Client().force_login(user)
+        self.assertEqual(cards.get_versions('author', [user.pk]), version)
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=20)
+class SharedPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=cls.author, text='test text')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_page_shared_between_users(self):
+        """Страница кешируется одна на всех, шапка у каждого своя."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        with self.assertNumQueries(2):
+            response = self.reader_client.get(url)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, '<!--hole:')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Избранные авторы')
+
+    def test_follow_button_filled_per_user(self):
+        """Кнопка подписки на закешированном профиле своя у читателя."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.reader_client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.reader_client.get(url), 'Отписаться')
+        self.assertContains(self.guest_client.get(url), 'Подписаться')
+
+    def test_new_post_resets_pages(self):
+        """Новый пост сразу виден на закешированной странице."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.guest_client.get(url)
+        Post.objects.create(author=self.author, text='fresh text')
+        self.assertContains(self.guest_client.get(url), 'fresh text')
+
+    def test_pinned_reader_bypasses_cache(self):
+        """Закреплённый за primary читатель видит страницу мимо кеша."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.guest_client.get(url)
+        Post.objects.update(text='updated text', updated_at=timezone.now())
+        self.assertNotContains(self.guest_client.get(url), 'updated text')
+        self.guest_client.cookies[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertContains(self.guest_client.get(url), 'updated text')
+
+    def test_key_ignores_unknown_params(self):
+        """В ключ идут только параметры ленты с правдоподобными значениями."""
+        factory = RequestFactory()
+        url = reverse('posts:index')
+        self.assertEqual(
+            holes.shared_page_key(factory.get(url, {'page': '2'})),
+            holes.shared_page_key(factory.get(f'{url}?page=2')),
+        )
+        for params in ({'utm': 'x'}, {'page': 'abc'}, {'page': '1' * 50}):
+            with self.subTest(params=params):
+                self.assertIsNone(
+                    holes.shared_page_key(factory.get(url, params))
+                )
+
+
+@override_settings(PREFETCH_FEEDS=True, PREFETCH_WORKERS=0)
+class PrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'text {i}') for i in range(15)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_next_page_prefetched(self):
+        """Следующая страница прогревается, и её использование считается."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.assertEqual(prefetch.stats()['prefetched'], 1)
+        # Прогретая страница читается по id без COUNT и OFFSET.
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, {'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+        self.assertEqual(
+            prefetch.stats(), {'prefetched': 1, 'used': 1, 'wasted': 0}
+        )
+        self.guest_client.get(url, {'fragment': 1})
+        out = StringIO()
+        call_command('prefetch_stats', stdout=out)
+        self.assertIn(
+            'Прогрето: 2, использовано: 1, впустую: 1.', out.getvalue()
+        )
+
+    def test_fragment_prefetched(self):
+        """Следующая порция с курсором читается по прогретым id."""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url, {'fragment': 1})
+        cursor = response.context['next_cursor']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                url, {'fragment': 1, 'cursor': cursor}
+            )
+        self.assertEqual(len(response.context['cards']), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(prefetch.stats()['used'], 1)
+
+    def test_follow_prefetch_per_user(self):
+        """Прогрев личной ленты не достаётся другому пользователю."""
+        url = reverse('posts:follow_index')
+        first, second = Client(), Client()
+        for client, name in ((first, 'first'), (second, 'second')):
+            reader = User.objects.create_user(username=name)
+            Follow.objects.create(user=reader, author=PrefetchTest.user)
+            client.force_login(reader)
+        first.get(url)
+        second.get(url, {'page': 2})
+        self.assertEqual(prefetch.stats()['used'], 0)
+        first.get(url, {'page': 2})
+        self.assertEqual(prefetch.stats()['used'], 1)
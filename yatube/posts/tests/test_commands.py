@@ -0,0 +1,228 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from ..management.commands import benchmark_sqlite
+from ..models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CleanMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.post = Post.objects.create(
+            author=CleanMediaTest.user,
+            text='test text',
+            image=SimpleUploadedFile('kept.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.orphan = self.make_file('posts/orphan.gif')
+        self.stray = self.make_file('cache/ab/cd/stray.jpg')
+
+    def make_file(self, name):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(SMALL_GIF)
+        return path
+
+    def test_dry_run_keeps_files(self):
+        """Пробный запуск только считает освобождаемые байты."""
+        out = StringIO()
+        call_command('clean_media', '--dry-run', stdout=out)
+        self.assertIn(
+            f'Будет освобождено {2 * len(SMALL_GIF)} байт', out.getvalue()
+        )
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.stray))
+
+    def test_orphans_removed(self):
+        """Удаляются только файлы, на которые нет ссылок."""
+        call_command('clean_media', stdout=StringIO())
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.stray))
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+    def test_quarantine(self):
+        """В режиме карантина файлы переносятся, а не удаляются."""
+        call_command('clean_media', '--quarantine', 'trash', stdout=StringIO())
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, 'trash', 'posts', 'orphan.gif')
+        ))
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RebuildThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='test text',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        cls.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_rebuild_with_checkpoint(self):
+        """Миниатюры создаются, а повторный запуск продолжает с чекпоинта."""
+        out = StringIO()
+        call_command(
+            'rebuild_thumbnails', '--workers', '1', '--force',
+            '--checkpoint', RebuildThumbnailsTest.checkpoint, stdout=out
+        )
+        self.assertIn('Готово: 1 картинок', out.getvalue())
+        image_file = ImageFile(RebuildThumbnailsTest.post.image.name)
+        self.assertTrue(
+            default.kvstore._get(image_file.key, identity='thumbnails')
+        )
+        with open(RebuildThumbnailsTest.checkpoint) as f:
+            self.assertEqual(f.read(), str(RebuildThumbnailsTest.post.pk))
+
+        out = StringIO()
+        call_command(
+            'rebuild_thumbnails', '--workers', '1',
+            '--checkpoint', RebuildThumbnailsTest.checkpoint, stdout=out
+        )
+        self.assertIn('Готово: 0 картинок', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        with open(os.path.join(self.source, 'small.gif'), 'wb') as f:
+            f.write(SMALL_GIF)
+
+    def run_import(self, records, *args):
+        path = os.path.join(self.source, 'import.jsonl')
+        with open(path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        out = StringIO()
+        call_command(
+            'import_posts', path, '--author', 'auth', '--images', self.source,
+            '--batch-size', '2', *args, stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_import(self):
+        """Импорт пачками сохраняет даты, связи и картинки."""
+        out = self.run_import([
+            {'type': 'post', 'id': 7, 'text': 'old',
+             'date': '2020-01-02T03:04:05+00:00', 'group': 'new-group',
+             'image': 'small.gif'},
+            {'type': 'post', 'id': 8, 'text': 'by other', 'author': 'other'},
+            {'type': 'comment', 'post': 7, 'text': 'hi', 'author': 'other'},
+            {'type': 'comment', 'post': 99, 'text': 'lost'},
+            {'type': 'follow', 'user': 'other', 'author': 'auth'},
+            {'type': 'follow', 'user': 'other', 'author': 'auth'},
+        ])
+        self.assertIn(
+            'постов 2, комментариев 1, подписок 1, пропущено 2', out
+        )
+        post = Post.objects.get(text='old')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group, Group.objects.get(slug='new-group'))
+        self.assertTrue(post.image.name.startswith(
+            Post._meta.get_field('image').upload_to
+        ))
+        other = User.objects.get(username='other')
+        self.assertFalse(other.has_usable_password())
+        self.assertEqual(Comment.objects.get().post, post)
+        self.assertEqual(Follow.objects.count(), 1)
+        Post.objects.create(author=self.user, text='after import')
+
+    def test_post_ids_bounded(self):
+        """Помнятся только последние посты; их комментарии импортируются."""
+        out = self.run_import([
+            {'type': 'post', 'id': 1, 'text': 'first'},
+            {'type': 'post', 'id': 2, 'text': 'second'},
+            {'type': 'comment', 'post': 1, 'text': 'recent'},
+            {'type': 'post', 'id': 3, 'text': 'third'},
+            {'type': 'comment', 'post': 2, 'text': 'forgotten'},
+            {'type': 'comment', 'post': 3, 'text': 'kept'},
+        ], '--post-ids-size', '2')
+        self.assertIn(
+            'постов 3, комментариев 2, подписок 0, пропущено 1', out
+        )
+        self.assertEqual(
+            set(Comment.objects.values_list('post__text', 'text')),
+            {('first', 'recent'), ('third', 'kept')},
+        )
+
+    def test_escaping_image_skipped(self):
+        """Пост с картинкой вне каталога импорта пропускается."""
+        with open(os.path.join(settings.BASE_DIR, 'outside.gif'), 'wb') as f:
+            f.write(SMALL_GIF)
+        self.addCleanup(
+            os.remove, os.path.join(settings.BASE_DIR, 'outside.gif')
+        )
+        out = self.run_import([
+            {'type': 'post', 'text': 'bad', 'image': '../outside.gif'},
+            {'type': 'post', 'text': 'good', 'image': 'small.gif'},
+        ])
+        self.assertIn('постов 1, комментариев 0, подписок 0, пропущено 1', out)
+        self.assertFalse(Post.objects.filter(text='bad').exists())
+
+
+class BenchmarkSqliteTest(TestCase):
+    @mock.patch.object(benchmark_sqlite, 'write', side_effect=TypeError)
+    def test_crashed_writer_reported(self, write):
+        """Упавший поток записи не выдаётся за ноль записей в секунду."""
+        user = User.objects.create_user(username='auth')
+        Post.objects.create(author=user, text='test text')
+        with self.assertRaisesMessage(CommandError, 'TypeError'):
+            call_command(
+                'benchmark_sqlite', '--seconds', '0.05',
+                '--readers', '0', '--writers', '1', stdout=StringIO(),
+            )
+        self.assertEqual(write.call_args[0][0], 'default')
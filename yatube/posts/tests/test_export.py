@@ -0,0 +1,84 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='тестовый текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text='hi')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ExportTest.user)
+        self.url = reverse('posts:export', args=(ExportTest.user.username,))
+
+    def test_jsonl_and_csv(self):
+        """Выгрузка отдаётся потоком в JSONL и CSV."""
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['type'] for row in rows], ['post', 'comment'])
+        self.assertEqual(rows[0]['text'], 'тестовый текст')
+        response = self.client.get(self.url, {'format': 'csv'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('type,id,post,text'))
+        self.assertIn('comment', content)
+
+    def test_zip_with_images(self):
+        """Zip содержит выгрузку и картинки постов."""
+        response = self.client.get(self.url, {'images': 1})
+        archive = zipfile.ZipFile(
+            io.BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertIn('export.jsonl', archive.namelist())
+        self.assertEqual(archive.read(ExportTest.post.image.name), SMALL_GIF)
+
+    def test_other_user_forbidden(self):
+        """Чужую выгрузку получить нельзя."""
+        client = Client()
+        client.force_login(ExportTest.other)
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_command(self):
+        """Команда пишет выгрузку в stdout."""
+        out = StringIO()
+        call_command('export_user', 'auth', '--format', 'csv', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post, User
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test group', slug='test-slug', description='test'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='test text'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_feeds(self):
+        """Ленты RSS и Atom для сайта, группы и автора."""
+        urls = (
+            reverse('posts:site_rss'),
+            reverse('posts:site_atom'),
+            reverse('posts:group_rss', args=(self.group.slug,)),
+            reverse('posts:group_atom', args=(self.group.slug,)),
+            reverse('posts:author_rss', args=(self.user.username,)),
+            reverse('posts:author_atom', args=(self.user.username,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'test text')
+                self.assertTrue(response.has_header('Last-Modified'))
+        response = self.guest_client.get(
+            reverse('posts:group_rss', args=('missing',))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_until_post_changed(self):
+        """Опрос без изменений заканчивается 304, правка сбрасывает кеш."""
+        url = reverse('posts:group_atom', args=(self.group.slug,))
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.post.text = 'changed text'
+        self.post.group = None
+        self.post.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'changed text')
+        self.assertContains(
+            self.guest_client.get(reverse('posts:site_rss')), 'changed text'
+        )
+
+    @override_settings(
+        SITE_URL='https://yatube.example', ALLOWED_HOSTS=['mirror.example']
+    )
+    def test_links_from_site_url(self):
+        """Ссылки ленты берутся из SITE_URL, посты читаются один раз."""
+        url = reverse('posts:author_atom', args=(self.user.username,))
+        # Автор, список id ленты и сами посты.
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(url, HTTP_HOST='mirror.example')
+        self.assertContains(
+            response, f'https://yatube.example/posts/{self.post.pk}/'
+        )
+        self.assertContains(response, f'https://yatube.example{url}')
+        self.assertNotContains(response, 'mirror.example')
+        self.assertTrue(response.has_header('Last-Modified'))
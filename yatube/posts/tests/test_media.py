@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+
+from ..images import variant_url
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_VARIANTS_ROOT = os.path.join(TEMP_MEDIA_ROOT, 'variants')
+TEMP_STATIC_ROOT = os.path.join(TEMP_MEDIA_ROOT, 'static')
+
+
+def make_image(size=(400, 200)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (255, 0, 0)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_VARIANTS_ROOT=TEMP_VARIANTS_ROOT,
+)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='test text',
+            image=SimpleUploadedFile('red.png', make_image(), 'image/png'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_variant_resized(self):
+        """Картинка отдаётся нужной ширины и формата."""
+        url = variant_url(ImageVariantTests.post.image.name, 100, 70, 'webp')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (100, 50))
+
+    def test_bad_signature(self):
+        """Ссылка с чужими параметрами не работает."""
+        url = variant_url(ImageVariantTests.post.image.name, 100)
+        response = self.guest_client.get(url.replace('/100/', '/200/'))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_conditional_and_range(self):
+        """Поддерживаются If-None-Match и Range."""
+        url = variant_url(ImageVariantTests.post.image.name, 100)
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.guest_client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(len(b''.join(response.streaming_content)), 10)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    STATIC_ROOT=TEMP_STATIC_ROOT,
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+)
+class StaticServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.css_url = staticfiles_storage.url('css/bootstrap.min.css')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_hashed_precompressed(self):
+        """Статика с хешем в имени отдаётся сжатой и кешируется навсегда."""
+        self.assertRegex(
+            StaticServingTests.css_url, r'bootstrap\.min\.[0-9a-f]{12}\.css$'
+        )
+        response = self.guest_client.get(
+            StaticServingTests.css_url, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_refused_encoding(self):
+        """Кодировка с q=0 не выбирается, даже если копия есть."""
+        response = self.guest_client.get(
+            StaticServingTests.css_url, HTTP_ACCEPT_ENCODING='gzip;q=0, br'
+        )
+        self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+
+    def test_plain_without_accept_encoding(self):
+        """Без Accept-Encoding отдаётся несжатый файл."""
+        response = self.guest_client.get(StaticServingTests.css_url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(
+        SENDFILE_BACKEND='x-accel-redirect',
+        SENDFILE_ACCEL_LOCATIONS={TEMP_STATIC_ROOT: '/internal/static/'},
+    )
+    def test_accel_redirect(self):
+        """Отдача передаётся веб-серверу через X-Accel-Redirect."""
+        response = self.guest_client.get('/static/css/bootstrap.min.css')
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/internal/static/css/bootstrap.min.css'
+        )
+        self.assertEqual(response.content, b'')
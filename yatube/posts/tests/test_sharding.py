@@ -0,0 +1,287 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import sharding, sitemaps
+from ..export import export_rows
+from ..models import AuthorShard, Comment, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(POST_SHARDS=['default'])
+class ShardingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+        Post.objects.bulk_create(
+            Post(author=user, text=f'пост {i}')
+            for i in range(6) for user in (cls.user, cls.other)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ShardingTest.user)
+
+    def test_merged_posts(self):
+        """Порции шардов сливаются по дате, как один запрос."""
+        merged = sharding.MergedPosts([
+            Post.objects.filter(author=ShardingTest.user),
+            Post.objects.filter(author=ShardingTest.other),
+        ])
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        self.assertEqual(merged.count(), 12)
+        self.assertEqual(list(merged), expected)
+        self.assertEqual(merged[3:7], expected[3:7])
+        self.assertEqual(merged[0], expected[0])
+        self.assertEqual(
+            list(merged.order_by('pub_date', 'pk')), expected[::-1]
+        )
+
+    def test_author_directory(self):
+        """Шард автора выбирается один раз и записывается в справочник."""
+        self.assertEqual(
+            sharding.shard_for_author(ShardingTest.user.pk), 'default'
+        )
+        self.assertTrue(
+            AuthorShard.objects.filter(author=ShardingTest.user).exists()
+        )
+        self.assertEqual(
+            sharding.move_author(ShardingTest.user.pk, 'default'), 0
+        )
+
+    def test_views(self):
+        """Ленты, профиль и пост читаются через шарды."""
+        post = Post.objects.filter(author=ShardingTest.user).first()
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        response = self.client.get(
+            reverse('posts:profile', args=[ShardingTest.user.username])
+        )
+        self.assertEqual(len(response.context['page_obj']), 6)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.context['post'], post)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[10 ** 9])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    POST_SHARDS=['shard1', 'shard2'], MEDIA_ROOT=TEMP_MEDIA_ROOT
+)
+class ShardDatabasesTest(TestCase):
+    """Шардинг на двух настоящих базах, отдельных от default."""
+
+    databases = {'default', 'shard1', 'shard2'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        cls.first = User.objects.create(username='first')
+        cls.second = User.objects.create(username='second')
+        AuthorShard.objects.create(author=cls.first, alias='shard1')
+        AuthorShard.objects.create(author=cls.second, alias='shard2')
+        for alias in settings.POST_SHARDS:
+            sharding.seed_sequences(alias)
+        # Шард выбирается по экземпляру, поэтому записи создаются
+        # через save(): objects.create() пишет в базу по умолчанию.
+        cls.post = Post(author=cls.first, text='первый', group=cls.group)
+        cls.post.save()
+        cls.other_post = Post(author=cls.second, text='второй')
+        cls.other_post.save()
+        cls.comment = Comment(post=cls.post, author=cls.second, text='ответ')
+        cls.comment.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def _should_check_constraints(self, connection):
+        # В шардах нет пользователей и групп. Рабочим соединениям шардов
+        # внешние ключи выключает configure_shard, а тестовые базы
+        # создаются до того, как он включается.
+        if connection.alias in settings.POST_SHARDS:
+            return False
+        return super()._should_check_constraints(connection)
+
+    def test_id_ranges(self):
+        """Посты и комментарии лежат в шарде автора поста в его диапазоне."""
+        post = ShardDatabasesTest.post
+        other_post = ShardDatabasesTest.other_post
+        self.assertEqual(post._state.db, 'shard1')
+        self.assertEqual(other_post._state.db, 'shard2')
+        self.assertLess(post.pk, sharding.SHARD_ID_SPAN)
+        self.assertGreater(other_post.pk, sharding.SHARD_ID_SPAN)
+        self.assertTrue(
+            Comment.objects.using('shard1')
+            .filter(pk=ShardDatabasesTest.comment.pk).exists()
+        )
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(sharding.locate(other_post.pk), 'shard2')
+
+    def test_foreign_keys_off(self):
+        """Новые соединения шардов работают без внешних ключей."""
+        for alias, expected in (('shard1', 0), ('default', 1)):
+            connection = connections[alias].copy()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA foreign_keys')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+            finally:
+                connection.close()
+
+    def test_move_author(self):
+        """Перенос автора копирует посты и комментарии в другую базу."""
+        post = ShardDatabasesTest.post
+        first = ShardDatabasesTest.first
+        self.assertEqual(sharding.move_author(first.pk, 'shard2'), 1)
+        self.assertFalse(Post.objects.using('shard1').exists())
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        self.assertEqual(
+            Post.objects.using('shard2').get(pk=post.pk).pub_date,
+            post.pub_date,
+        )
+        self.assertTrue(
+            Comment.objects.using('shard2')
+            .filter(pk=ShardDatabasesTest.comment.pk).exists()
+        )
+        self.assertEqual(sharding.shard_for_author(first.pk), 'shard2')
+        response = Client().get(reverse('posts:post_detail', args=[post.pk]))
+        self.assertEqual(response.context['post'], post)
+        new = Post(author=first, text='после переноса')
+        new.save()
+        self.assertEqual(new._state.db, 'shard2')
+        self.assertGreater(new.pk, ShardDatabasesTest.other_post.pk)
+        sharding.seed_sequences('shard1')
+        self.assertEqual(sharding.last_id(Post, 'shard1'), post.pk)
+
+    def test_readers(self):
+        """API, ленты, выгрузка и карта сайта видят оба шарда."""
+        post = ShardDatabasesTest.post
+        other_post = ShardDatabasesTest.other_post
+        client = Client()
+        results = client.get(reverse('api:posts')).json()['results']
+        self.assertEqual(
+            [(item['id'], item['author'], item['group']) for item in results],
+            [(other_post.pk, 'second', None), (post.pk, 'first', 'group')],
+        )
+        results = client.get(
+            reverse('api:comments', args=[post.pk])
+        ).json()['results']
+        self.assertEqual(results[0]['author'], 'second')
+        response = client.get(reverse('posts:site_rss'))
+        self.assertContains(response, 'первый')
+        self.assertContains(response, 'второй')
+        rows = list(export_rows(ShardDatabasesTest.second))
+        self.assertEqual(
+            [(row['type'], row['id']) for row in rows],
+            [
+                ('post', other_post.pk),
+                ('comment', ShardDatabasesTest.comment.pk),
+            ],
+        )
+        row, = export_rows(ShardDatabasesTest.first)
+        self.assertEqual(row['group'], 'group')
+        with override_settings(SITEMAP_ROOT=TEMP_MEDIA_ROOT):
+            shards = sitemaps.refresh_manifest()
+            self.assertEqual(
+                [shard['start'] for shard in shards],
+                [0, sharding.SHARD_ID_SPAN],
+            )
+            content = ''.join(
+                gzip.decompress(b''.join(Client().get(
+                    reverse('posts:sitemap_shard', args=(number,))
+                ).streaming_content)).decode()
+                for number in range(len(shards))
+            )
+        for item in (post, other_post):
+            self.assertIn(
+                reverse('posts:post_detail', args=(item.pk,)), content
+            )
+
+    def test_delete_author(self):
+        """Удаление автора чистит его посты и комментарии во всех шардах."""
+        Comment(
+            post=ShardDatabasesTest.other_post,
+            author=ShardDatabasesTest.first,
+            text='свой',
+        ).save()
+        User.objects.get(pk=ShardDatabasesTest.first.pk).delete()
+        for alias in settings.POST_SHARDS:
+            with self.subTest(alias=alias):
+                self.assertFalse(Post.objects.using(alias).filter(
+                    author_id=ShardDatabasesTest.first.pk
+                ).exists())
+                self.assertFalse(Comment.objects.using(alias).filter(
+                    author_id=ShardDatabasesTest.first.pk
+                ).exists())
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        self.assertFalse(AuthorShard.objects.filter(
+            author_id=ShardDatabasesTest.first.pk
+        ).exists())
+        client = Client()
+        response = client.get(reverse('posts:index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [ShardDatabasesTest.other_post],
+        )
+        response = client.get(reverse('posts:group_list', args=['group']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_clean_media(self):
+        """Картинка поста из шарда не считается лишней."""
+        Post.objects.using('shard2').filter(
+            pk=ShardDatabasesTest.other_post.pk
+        ).update(image='posts/used.gif')
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('used.gif', 'unused.gif'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', name), 'wb'):
+                pass
+        out = StringIO()
+        call_command('clean_media', '--dry-run', stdout=out)
+        self.assertIn('posts/unused.gif', out.getvalue())
+        self.assertNotIn('posts/used.gif', out.getvalue())
+
+    def test_import(self):
+        """Импорт пишет посты и комментарии в шарды авторов."""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'import.jsonl')
+        records = [
+            {'type': 'post', 'id': 1, 'text': 'a', 'author': 'first'},
+            {'type': 'post', 'id': 2, 'text': 'b', 'author': 'second'},
+            {'type': 'comment', 'post': 2, 'text': 'c', 'author': 'first'},
+        ]
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+        call_command('import_posts', path, stdout=StringIO())
+        imported = Post.objects.using('shard1').get(text='a')
+        self.assertLess(imported.pk, sharding.SHARD_ID_SPAN)
+        imported = Post.objects.using('shard2').get(text='b')
+        self.assertGreater(imported.pk, ShardDatabasesTest.other_post.pk)
+        self.assertEqual(
+            Comment.objects.using('shard2').get(text='c').post_id,
+            imported.pk,
+        )
+        self.assertFalse(Post.objects.using('default').exists())
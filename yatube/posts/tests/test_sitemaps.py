@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import sitemaps
+from ..models import Post, User
+
+TEMP_SITEMAP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    SITEMAP_ROOT=TEMP_SITEMAP_ROOT, SITE_URL='https://yatube.example'
+)
+@mock.patch.object(sitemaps, 'SHARD_SIZE', 2)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_SITEMAP_ROOT, ignore_errors=True)
+        self.guest_client = Client()
+        self.posts = [
+            Post.objects.create(author=self.user, text=f'text {i}')
+            for i in range(3)
+        ]
+
+    def read_shard(self, shard):
+        response = self.guest_client.get(
+            reverse('posts:sitemap_shard', args=(shard,))
+        )
+        self.assertEqual(response.status_code, 200)
+        return gzip.decompress(b''.join(response.streaming_content)).decode()
+
+    def shard_of(self, post):
+        """Номер шарда, в который попал пост."""
+        for number, shard in enumerate(sitemaps.refresh_manifest()):
+            if shard['after'] < post.pk and (
+                shard['last'] is None or post.pk <= shard['last']
+            ):
+                return number
+        return None
+
+    def test_index_and_shards(self):
+        """Индекс ссылается на шарды по SHARD_SIZE постов подряд."""
+        response = self.guest_client.get(reverse('posts:sitemap_index'))
+        self.assertContains(
+            response, reverse('posts:sitemap_shard', args=(1,))
+        )
+        self.assertNotContains(
+            response, reverse('posts:sitemap_shard', args=(2,))
+        )
+        content = self.read_shard(0)
+        for post in self.posts[:2]:
+            self.assertIn(
+                reverse('posts:post_detail', args=(post.pk,)), content
+            )
+        self.assertIn(
+            reverse('posts:post_detail', args=(self.posts[2].pk,)),
+            self.read_shard(1),
+        )
+        response = self.guest_client.get(
+            reverse('posts:sitemap_shard', args=(2,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_shards_dense_after_gaps(self):
+        """Пропуски в id не порождают пустых шардов."""
+        Post.objects.filter(pk=self.posts[1].pk).delete()
+        post = Post.objects.create(
+            pk=self.posts[-1].pk + 1000, author=self.user, text='far'
+        )
+        self.assertEqual(self.shard_of(post), 1)
+        self.assertEqual(len(sitemaps.refresh_manifest()), 2)
+
+    def test_only_changed_shards_rebuilt(self):
+        """Новый пост пересобирает только шард, куда он попал."""
+        call_command('build_sitemaps', stdout=StringIO())
+        old = sitemaps.shard_path(0)
+        os.utime(old, (0, 0))
+        post = Post.objects.create(author=self.user, text='new')
+        self.assertEqual(self.shard_of(post), 1)
+        self.assertIn(
+            reverse('posts:post_detail', args=(post.pk,)),
+            self.read_shard(1),
+        )
+        self.read_shard(0)
+        self.assertEqual(os.path.getmtime(old), 0)
+
+    def test_deleted_post_removed(self):
+        """Удалённый пост пропадает и из давно собранного шарда."""
+        call_command('build_sitemaps', stdout=StringIO())
+        post = self.posts[0]
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertNotIn(
+            reverse('posts:post_detail', args=(post.pk,)),
+            self.read_shard(0),
+        )
+
+    def test_imported_posts_listed(self):
+        """Импорт со старыми датами тоже обновляет карту сайта."""
+        call_command('build_sitemaps', stdout=StringIO())
+        path = os.path.join(TEMP_SITEMAP_ROOT, 'import.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({
+                'type': 'post', 'text': 'old', 'author': 'auth',
+                'date': '2001-01-01T00:00:00+00:00',
+            }) + '\n')
+        call_command('import_posts', path, stdout=StringIO())
+        post = Post.objects.get(text='old')
+        self.assertIn(
+            reverse('posts:post_detail', args=(post.pk,)),
+            self.read_shard(self.shard_of(post)),
+        )
+
+    @override_settings(ALLOWED_HOSTS=['mirror.example'])
+    def test_site_url_not_request_host(self):
+        """Адреса в шарде берутся из SITE_URL, а не из заголовка Host."""
+        response = self.guest_client.get(
+            reverse('posts:sitemap_shard', args=(0,)),
+            HTTP_HOST='mirror.example',
+        )
+        content = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode()
+        self.assertIn('<loc>https://yatube.example/posts/', content)
+        self.assertNotIn('mirror.example', content)
@@ -1,5 +1,7 @@
+import re
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
@@ -7,6 +9,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from .. import views
 from ..models import Follow, Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -206,6 +209,40 @@ class PostPagesTests(TestCase):
                         len(response.context['page_obj']), post_num
                     )
 
+    def test_feed_fragments(self):
+        """Лента отдаётся порциями карточек с курсором следующей порции."""
+        Post.objects.bulk_create(
+            Post(
+                text=f'текст {i}',
+                author=PostPagesTests.user,
+                group=PostPagesTests.group,
+            ) for i in range(13)
+        )
+        urls = (
+            PostPagesTests.reverses['index'][1],
+            PostPagesTests.reverses['group_list'][1],
+            PostPagesTests.reverses['profile'][1],
+            PostPagesTests.reverses['follow_index'][1],
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.follower_user.get(url, {'fragment': 1})
+                content = response.content.decode()
+                self.assertNotIn('<html', content)
+                self.assertEqual(content.count('<article>'), 10)
+                cursor = re.search(r'data-cursor="([^"]+)"', content)[1]
+                response = self.follower_user.get(
+                    url, {'fragment': 1, 'cursor': cursor}
+                )
+                self.assertEqual(
+                    response.content.decode().count('<article>'), 4
+                )
+                self.assertNotContains(response, 'data-cursor')
+        response = self.guest_client.get(
+            urls[0], {'fragment': 1, 'cursor': '!'}
+        )
+        self.assertEqual(response.status_code, 404)
+
     def test_follow_unfollow(self):
         """Тест подписки на пользователей и удаление их из подписок."""
         self.follower_user.post(PostPagesTests.follow_rev)
@@ -233,3 +270,39 @@ class PostPagesTests(TestCase):
 
         response = self.follower_user.get(follow_index_rev)
         self.assertIn(self.post, response.context['page_obj'])
+
+    @override_settings(FEED_TEMPLATE_ENGINE='jinja2')
+    def test_feeds_jinja2(self):
+        """Ленты рендерятся шаблонами Jinja2."""
+        urls = (
+            PostPagesTests.reverses['index'][1],
+            PostPagesTests.reverses['group_list'][1],
+            PostPagesTests.reverses['profile'][1],
+            PostPagesTests.reverses['follow_index'][1],
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.follower_user.get(url)
+                self.assertContains(response, PostPagesTests.post.text)
+                self.assertContains(response, 'card-img')
+
+    @override_settings(FEED_TEMPLATE_ENGINES={'index': 'jinja2'})
+    def test_feed_engine_per_view(self):
+        """Движок выбирается для каждой ленты, и для её порций тоже."""
+        index = PostPagesTests.reverses['index'][1]
+        template, group = PostPagesTests.reverses['group_list']
+        response = self.follower_user.get(group)
+        self.assertTemplateUsed(response, template)
+        response = self.follower_user.get(index)
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertContains(response, PostPagesTests.post.text)
+        with mock.patch.object(
+            views, 'render_cards', wraps=views.render_cards
+        ) as render_cards:
+            for url in (index, group):
+                response = self.follower_user.get(url, {'fragment': 1})
+                self.assertContains(response, PostPagesTests.post.text)
+        self.assertEqual(
+            [call[1]['using'] for call in render_cards.call_args_list],
+            ['jinja2', 'django'],
+        )
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
@@ -25,4 +25,35 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        'profile/<str:username>/export/',
+        views.export_user,
+        name='export'
+    ),
+    path('feeds/rss/', feeds.SiteFeed(), name='site_rss'),
+    path('feeds/atom/', feeds.SiteAtomFeed(), name='site_atom'),
+    path('group/<slug:slug>/rss/', feeds.GroupFeed(), name='group_rss'),
+    path(
+        'group/<slug:slug>/atom/', feeds.GroupAtomFeed(), name='group_atom'
+    ),
+    path(
+        'profile/<str:username>/rss/', feeds.AuthorFeed(), name='author_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        feeds.AuthorAtomFeed(),
+        name='author_atom'
+    ),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path(
+        'sitemap-posts-<int:shard>.xml.gz',
+        views.sitemap_shard,
+        name='sitemap_shard'
+    ),
+    path(
+        'media/variants/<str:signature>/<int:width>/<int:quality>/'
+        '<str:fmt>/<path:name>',
+        views.image_variant,
+        name='image_variant'
+    ),
 ]
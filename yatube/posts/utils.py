@@ -1,8 +1,109 @@
-from django.core.paginator import Paginator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from contextlib import contextmanager
 
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
-def paginate(request, items, NUMBER_OF_POSTS):
+from .models import Comment, Post
+
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+DATE_FIELDS = (
+    (Post, 'pub_date'), (Post, 'updated_at'), (Comment, 'created'),
+)
+
+
+@contextmanager
+def preserved_dates():
+    """Отключает auto_now, чтобы сохранились уже известные даты."""
+    fields = [model._meta.get_field(name) for model, name in DATE_FIELDS]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def by_ids(items, ids):
+    """Записи items с id из ids в порядке ids."""
+    found = {item.pk: item for item in items.filter(pk__in=ids)}
+    return [found[pk] for pk in ids if pk in found]
+
+
+def paginate(request, items, NUMBER_OF_POSTS, prefetched=None):
+    """Страница ленты; prefetched — заранее прогретая страница.
+
+    Для прогретой страницы известны id постов и их общее число, так
+    что COUNT и OFFSET не выполняются.
+    """
     paginator = Paginator(items, NUMBER_OF_POSTS)
     page_number = request.GET.get('page')
+    if prefetched is not None:
+        paginator.count = prefetched['count']
+        return Page(
+            by_ids(items, prefetched['ids']), int(page_number), paginator
+        )
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def encode_cursor(date, pk):
+    value = f'{date.isoformat()}|{pk}'
+    return urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Дата и id последней показанной записи или None для плохого токена."""
+    try:
+        value = urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        date, pk = value.split('|')
+        date = parse_datetime(date)
+        if date is None:
+            return None
+        return date, int(pk)
+    except (DecodeError, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_filter(items, cursor, field='pub_date', descending=True):
+    """Записи по порядку (field, pk), идущие после курсора."""
+    if descending:
+        items = items.order_by(f'-{field}', '-pk')
+        lookup = 'lt'
+    else:
+        items = items.order_by(field, 'pk')
+        lookup = 'gt'
+    if cursor:
+        date, pk = cursor
+        items = items.filter(
+            Q(**{f'{field}__{lookup}': date})
+            | Q(**{field: date, f'pk__{lookup}': pk})
+        )
+    return items
+
+
+def keyset_rows(items, cursor, size):
+    """Порция после курсора и ещё один пост, если лента не кончилась."""
+    return keyset_filter(items, cursor)[:size + 1]
+
+
+def keyset_page(items, cursor, size, ids=None):
+    """Посты после курсора и курсор следующей порции (или None).
+
+    В отличие от номера страницы курсор не требует COUNT и OFFSET,
+    а новые посты не сдвигают уже прочитанную ленту. ids — id
+    прогретой порции из keyset_rows, её посты читаются по id.
+    """
+    if ids is None:
+        posts = list(keyset_rows(items, cursor, size))
+    else:
+        posts = by_ids(items, ids)
+    if len(posts) > size:
+        last = posts[size - 1]
+        return posts[:size], encode_cursor(last.pub_date, last.pk)
+    return posts, None
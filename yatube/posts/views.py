@@ -1,55 +1,160 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db import router
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils._os import safe_join
+from django.utils.safestring import mark_safe
+
+from core.db import replica_reads
+from core.holes import cache_page_shared
+from core.serving import serve_file
+from core.writer import write
 
+from . import export, images, prefetch, sharding, sitemaps
+from .cards import render_cards
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginate
+from .models import Comment, Follow, Group, Post, User
+from .utils import decode_cursor, keyset_page, keyset_rows, paginate
 
 NUMBER_OF_POSTS = 10
+FRAGMENT_PARAM = 'fragment'
 
 
-def index(request):
-    post_list = Post.objects.select_related('group', 'author')
-    page_obj = paginate(request, post_list, NUMBER_OF_POSTS)
+def feed_flags(context):
+    return {
+        'is_profile': context.get('is_profile', False),
+        'is_group_list': context.get('is_group_list', False),
+    }
+
+
+def feed_engine(view_name):
+    """Движок шаблонов ленты view_name."""
+    return settings.FEED_TEMPLATE_ENGINES.get(
+        view_name, settings.FEED_TEMPLATE_ENGINE
+    )
+
+
+def prefetch_key(request, name, value, per_user):
+    """Ключ прогрева страницы ленты; личные ленты у каждого свои."""
+    key = f'{request.path}?{name}={value}'
+    if per_user:
+        key += f'&user={request.user.pk}'
+    return key
+
+
+def feed_fragment(request, post_list, context, using, per_user):
+    """Только карточки постов и курсор следующей порции ленты."""
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = decode_cursor(request.GET['cursor'])
+        if cursor is None:
+            raise Http404('Неверный курсор ленты')
+    flags = feed_flags(context)
+    prefetched = prefetch.take(prefetch_key(
+        request, 'cursor', request.GET.get('cursor', ''), per_user
+    ))
+    posts, next_cursor = keyset_page(
+        post_list, cursor, NUMBER_OF_POSTS,
+        ids=prefetched and prefetched['ids'],
+    )
+    cards = render_cards(posts, using=using, **flags)
+    if next_cursor:
+        prefetch.schedule(
+            prefetch_key(request, 'cursor', next_cursor, per_user),
+            lambda: keyset_rows(
+                post_list, decode_cursor(next_cursor), NUMBER_OF_POSTS
+            ),
+            using=using,
+            **flags,
+        )
     context = {
-        'page_obj': page_obj,
+        'cards': [mark_safe(card) for card in cards],
+        'next_cursor': next_cursor,
     }
-    return render(request, 'posts/index.html', context)
+    return render(
+        request, 'includes/feed_fragment.html', context, using=using
+    )
+
+
+def render_feed(
+    request, template_name, post_list, context, using, per_user=False
+):
+    """Страница ленты или её порция движком шаблонов using.
+
+    per_user — лента своя у каждого пользователя.
+    """
+    if FRAGMENT_PARAM in request.GET:
+        return feed_fragment(request, post_list, context, using, per_user)
+    prefetched = prefetch.take(prefetch_key(
+        request, 'page', request.GET.get('page', '1'), per_user
+    ))
+    page_obj = paginate(request, post_list, NUMBER_OF_POSTS, prefetched)
+    context['page_obj'] = page_obj
+    if page_obj.has_next():
+        next_number = page_obj.next_page_number()
+        prefetch.schedule(
+            prefetch_key(request, 'page', next_number, per_user),
+            lambda: page_obj.paginator.page(next_number).object_list,
+            total=page_obj.paginator.count,
+            using=using,
+            **feed_flags(context),
+        )
+    return render(request, template_name, context, using=using)
+
+
+@cache_page_shared
+@replica_reads
+def index(request):
+    post_list = sharding.scatter(
+        Post.objects.select_related('group', 'author')
+    )
+    return render_feed(
+        request, 'posts/index.html', post_list, {},
+        using=feed_engine('index'),
+    )
 
 
+@cache_page_shared
+@replica_reads
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('group')
-    page_obj = paginate(request, post_list, NUMBER_OF_POSTS)
+    post_list = sharding.scatter(group.posts.select_related('group'))
     context = {
         'group': group,
-        'page_obj': page_obj,
         'is_group_list': True,
     }
-    return render(request, 'posts/group_list.html', context)
+    return render_feed(
+        request, 'posts/group_list.html', post_list, context,
+        using=feed_engine('group_posts'),
+    )
 
 
+@cache_page_shared
+@replica_reads
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    author_post = author.posts.select_related('author')
-    page_obj = paginate(request, author_post, NUMBER_OF_POSTS)
-    following = False
-    if request.user.is_authenticated:
-        if Follow.objects.filter(user=request.user, author=author):
-            following = True
+    author_post = sharding.for_author(
+        author.posts.select_related('author'), author.pk
+    )
     context = {
         'author': author,
-        'page_obj': page_obj,
         'is_profile': True,
-        'following': following
     }
-    return render(request, 'posts/profile.html', context)
+    return render_feed(
+        request, 'posts/profile.html', author_post, context,
+        using=feed_engine('profile'),
+    )
 
 
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(sharding.post_queryset(post_id), id=post_id)
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('post')
+    comments = post.comments.all()
     context = {
         'post': post,
         'form': form,
@@ -76,7 +181,7 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(sharding.post_queryset(post_id), id=post_id)
 
     if post.author != request.user:
         return redirect('posts:profile', request.user.username)
@@ -102,23 +207,28 @@ def post_edit(request, post_id):
 @login_required()
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(sharding.post_queryset(post_id), id=post_id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write(router.db_for_write(Comment, instance=comment), comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate(request, post_list, NUMBER_OF_POSTS)
-    context = {
-        'page_obj': page_obj
-    }
-    return render(request, 'posts/follow.html', context)
+    author_ids = list(
+        request.user.follower.values_list('author_id', flat=True)
+    )
+    post_list = sharding.scatter(
+        Post.objects.filter(author_id__in=author_ids), author_ids
+    )
+    return render_feed(
+        request, 'posts/follow.html', post_list, {},
+        using=feed_engine('follow_index'), per_user=True,
+    )
 
 
 @login_required
@@ -126,7 +236,10 @@ def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
     if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+        write(
+            router.db_for_write(Follow),
+            Follow.objects.get_or_create, user=user, author=author,
+        )
     return redirect('posts:follow_index')
 
 
@@ -134,5 +247,62 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=user, author=author).delete()
+    write(
+        router.db_for_write(Follow),
+        Follow.objects.filter(user=user, author=author).delete,
+    )
     return redirect('posts:follow_index')
+
+
+def image_variant(request, signature, width, quality, fmt, name):
+    if (
+        fmt not in images.FORMATS
+        or not 0 < width <= images.MAX_WIDTH
+        or not 0 < quality <= 100
+        or not images.check_signature(signature, name, width, quality, fmt)
+    ):
+        raise Http404('Неверная ссылка на картинку')
+    try:
+        source_path = safe_join(settings.MEDIA_ROOT, name)
+    except ValueError:
+        raise Http404('Неверная ссылка на картинку')
+    if not os.path.isfile(source_path):
+        raise Http404('Картинка не найдена')
+    key, path = images.get_variant(source_path, width, quality, fmt)
+    return serve_file(request, path, images.FORMATS[fmt][1], etag=key)
+
+
+@login_required
+def export_user(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in export.FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    if request.GET.get('images'):
+        response = StreamingHttpResponse(
+            export.export_zip(author, fmt), content_type='application/zip'
+        )
+        filename = f'{username}.zip'
+    else:
+        response = StreamingHttpResponse(
+            export.export_lines(author, fmt),
+            content_type=f'{export.FORMATS[fmt]}; charset=utf-8',
+        )
+        filename = f'{username}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def sitemap_index(request):
+    return HttpResponse(
+        sitemaps.render_index(), content_type='application/xml'
+    )
+
+
+def sitemap_shard(request, shard):
+    path = sitemaps.get_shard(shard)
+    if path is None:
+        raise Http404('Шард карты сайта не найден')
+    return serve_file(request, path, 'application/gzip')
@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -29,10 +30,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'core.db.ReplicaMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.holes.HolePunchMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,8 +60,34 @@ TEMPLATES = [
             ],
         },
     },
+    {
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'jinja2')],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+        },
+    },
 ]
 
+# Движок шаблонов лент постов: 'django' или 'jinja2'
+FEED_TEMPLATE_ENGINE = 'django'
+
+# Движки отдельных лент по имени view, например {'index': 'jinja2'};
+# остальные ленты рендерит FEED_TEMPLATE_ENGINE.
+FEED_TEMPLATE_ENGINES = {}
+
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('core.template_loaders.Loader', [
+            ('core.template_loaders.MinifyingLoader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ]),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
@@ -67,6 +97,109 @@ DATABASES = {
     }
 }
 
+# Локально реплики заменяют SQLite-файлы, их наполняет sync_replicas.
+DATABASE_REPLICAS = [
+    alias for alias in os.environ.get('YATUBE_REPLICAS', '').split(',')
+    if alias
+]
+
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# replica объявлена всегда, чтобы тесты проверяли роутер на настоящей
+# отдельной базе; без YATUBE_REPLICAS к ней никто не подключается.
+DATABASES.setdefault('replica', {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+})
+
+# Посты и комментарии делятся по авторам между базами из YATUBE_SHARDS,
+# новые шарды готовит init_shards. Пустой список выключает шардинг.
+POST_SHARDS = [
+    alias for alias in os.environ.get('YATUBE_SHARDS', '').split(',')
+    if alias
+]
+
+# shard1 и shard2 объявлены всегда, чтобы тесты гоняли шардинг на
+# настоящих отдельных базах; без YATUBE_SHARDS к ним никто не подключается.
+for alias in ['shard1', 'shard2', *POST_SHARDS]:
+    DATABASES.setdefault(alias, {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-shard-{alias}.sqlite3'),
+    })
+
+# Сессии, хранилище sorl-thumbnail и часто меняющиеся таблицы можно
+# вынести в свои SQLite-файлы со своей блокировкой записи. Включённые
+# базы перечисляются в YATUBE_SPLIT_DATABASES, таблицы в них создаёт
+# manage.py migrate --database <база>.
+SPLIT_DATABASE_MODELS = {
+    'sessions': ['sessions'],
+    'thumbnails': ['thumbnail'],
+    'hot': ['posts.follow', 'posts.comment'],
+}
+
+SPLIT_DATABASES = [
+    alias
+    for alias in os.environ.get('YATUBE_SPLIT_DATABASES', '').split(',')
+    if alias in SPLIT_DATABASE_MODELS
+]
+
+# Комментарии при шардинге живут в шарде поста, а не в hot.
+DATABASE_APPS = {
+    label: alias
+    for alias in SPLIT_DATABASES
+    for label in SPLIT_DATABASE_MODELS[alias]
+    if not (POST_SHARDS and label == 'posts.comment')
+}
+
+# Отдельные базы объявлены всегда, чтобы тесты гоняли их на настоящих
+# файлах; без YATUBE_SPLIT_DATABASES в них ничего не направляется.
+for alias in SPLIT_DATABASE_MODELS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+    }
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.db.AppRouter',
+    'core.db.ReplicaRouter',
+]
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# Комментарии в hot ссылаются на посты из другого файла, а миниатюры
+# можно пересобрать, поэтому им не нужна надёжность основной базы.
+SQLITE_ALIAS_PRAGMAS = {
+    'hot': {'foreign_keys': 'off'},
+    'thumbnails': {'synchronous': 'off'},
+}
+
+SQLITE_MAINTENANCE_INTERVAL = 60 * 60
+
+GROUP_COMMIT_WRITES = False
+
+GROUP_COMMIT_WINDOW = 0.005
+
+GROUP_COMMIT_MAX_BATCH = 200
+
+GROUP_COMMIT_TIMEOUT = 10
+
+REPLICA_PIN_COOKIE = 'use_primary'
+
+REPLICA_PIN_SECONDS = 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -94,12 +227,41 @@ USE_TZ = True
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.caches.LRUCache',
+        'OPTIONS': {
+            'MAX_BYTES': 64 * 1024 * 1024,
+            'MAX_ITEM_BYTES': 1024 * 1024,
+        },
     }
 }
 
+# В продакшене у каждого воркера свой L1, а L2 и таблица поколений
+# в общих файлах, так что сброс кеша виден всем процессам.
+if not DEBUG:
+    CACHES['default'] = {
+        'BACKEND': 'core.caches.TieredCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'L1_MAX_BYTES': 16 * 1024 * 1024,
+            'L1_MAX_ITEM_BYTES': 1024 * 1024,
+            'L1_TIMEOUT': 5,
+        },
+    }
+
+PAGE_CACHE_TIMEOUT = 0 if DEBUG else 20
+
+PREFETCH_FEEDS = not DEBUG
+
+PREFETCH_WORKERS = 2
+
 STATIC_URL = '/static/'
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -110,6 +272,29 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+PRERENDER_PAGES = not DEBUG
+
+PRERENDERED_ROOT = os.path.join(BASE_DIR, 'prerendered')
+
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+
+# Адрес сайта для карты сайта: готовые шарды лежат на диске, поэтому
+# хост не берётся из запроса.
+SITE_URL = os.environ.get('YATUBE_SITE_URL', 'http://localhost:8000').rstrip('/')
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+IMAGE_VARIANTS_ROOT = os.path.join(BASE_DIR, 'variants')
+
+IMAGE_VARIANTS_MAX_BYTES = 256 * 1024 * 1024
+
+# None, 'x-sendfile' (Apache, lighttpd) или 'x-accel-redirect' (nginx)
+SENDFILE_BACKEND = None
+
+SENDFILE_ACCEL_LOCATIONS = {
+    MEDIA_ROOT: '/internal/media/',
+    STATIC_ROOT: '/internal/static/',
+    IMAGE_VARIANTS_ROOT: '/internal/variants/',
+}
@@ -5,3 +5,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if not settings.DEBUG:
+    from core import prerender  # noqa: E402
+    from core.template_loaders import warmup  # noqa: E402
+    warmup()
+    prerender.load()